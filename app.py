@@ -1,7 +1,28 @@
+import time
+import uuid
 import streamlit as st
+# Imported first so the startup report covers the app's own imports
+from utils.startup import mark_first_run_complete, startup_report
 from config.settings import Settings
 from utils.gemini_client import GeminiClient
-from tabs import image_generation
+from utils.client_pool import get_client_registry
+from utils.encoding import get_encoder
+from utils.generation_cache import get_generation_cache
+from utils.history_store import get_history_store
+from utils.instrumentation import current_session, get_instrumentation, observe, start_metrics_server
+from utils.job_queue import get_job_queue
+from utils.phash import get_hash_index_stats
+from utils.preprocess import get_preprocessor
+from utils.process_pool import get_process_pool
+from utils.progress import ttff_summary
+from utils.providers import get_all_provider_stats
+from utils.rate_limiter import get_rate_limiter_stats
+from utils.resilience import get_resilience_metrics
+from utils.single_flight import get_single_flight
+from utils.utils import init_session_state
+from tabs import image_generation, image_editing, face_body, headshot_studio
+
+rerun_started = time.perf_counter()
 
 # Page configuration
 st.set_page_config(
@@ -18,6 +39,13 @@ if 'conversation_history' not in st.session_state:
     st.session_state.conversation_history = []
 if 'current_api_key' not in st.session_state:
     st.session_state.current_api_key = None
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+init_session_state()
+
+# Attribute timings from this run (and jobs it submits) to the session
+current_session.set(st.session_state.session_id)
+metrics_port = start_metrics_server()
 
 # App title
 st.title("🎨 AI Image Editor with Gemini")
@@ -29,8 +57,9 @@ with st.sidebar:
     
     # Check if API key is in secrets
     api_key_from_secrets = Settings.get_gemini_api_key()
+    secrets_available = Settings.has_api_key_in_secrets()
     
-    if Settings.has_api_key_in_secrets():
+    if secrets_available:
         st.success("🔑 API Key loaded from secrets")
         api_key = api_key_from_secrets
         
@@ -130,7 +159,41 @@ with st.sidebar:
         st.write("Session State:")
         st.write(f"- Has client: {bool(st.session_state.get('gemini_client'))}")
         st.write(f"- API key set: {bool(st.session_state.get('current_api_key'))}")
-        st.write(f"- Secrets available: {Settings.has_api_key_in_secrets()}")
+        st.write(f"- Secrets available: {secrets_available}")
+        st.write("Generation Cache:")
+        st.json(get_generation_cache().stats())
+        st.write("Generation Jobs:")
+        st.json(get_job_queue().stats())
+        st.write("Client Pool:")
+        st.json(get_client_registry().stats())
+        st.write("API Quota Queue:")
+        st.json(get_rate_limiter_stats())
+        st.write("Request Coalescing:")
+        st.json(get_single_flight().stats())
+        st.write("Backend Resilience:")
+        st.json(get_resilience_metrics())
+        st.write("Provider Routing:")
+        st.json(get_all_provider_stats())
+        st.write("Encoded Variants:")
+        st.json(get_encoder().stats())
+        st.write("History Store:")
+        st.json(get_history_store().stats())
+        st.write("Perceptual Hash Index:")
+        st.json({'similar_uploads': get_preprocessor().similar_uploads, **get_hash_index_stats()})
+        st.write("Image Worker Pool:")
+        st.json(get_process_pool().stats())
+        st.write("Time to First Feedback (s):")
+        st.json(ttff_summary())
+        st.write("Latency Breakdown (this session, recent):")
+        breakdown = get_instrumentation().session_breakdown(st.session_state.session_id)
+        if breakdown:
+            st.table(breakdown)
+        else:
+            st.caption("No timings recorded yet")
+        st.write("Startup:")
+        st.json(startup_report())
+        if metrics_port:
+            st.caption(f"Prometheus metrics: http://127.0.0.1:{metrics_port}/metrics")
 
 # Main tabs
 tab1, tab2, tab3, tab4 = st.tabs([
@@ -143,68 +206,18 @@ tab1, tab2, tab3, tab4 = st.tabs([
 # Check if API is configured before showing tab content
 api_ready = st.session_state.get('gemini_client') is not None
 
+# Each tab is a fragment: interacting with one reruns only that tab
 with tab1:
-    if api_ready:
-        image_generation.render()
-    else:
-        st.warning("⚠️ Please configure your Gemini API key in the sidebar first.")
-        st.info("Once connected, you'll be able to generate images with AI!")
-        
-        # Show preview of what's coming
-        st.markdown("### 🎨 Image Generation Features:")
-        st.markdown("""
-        - **Natural Language Prompts**: Describe images in plain English
-        - **Style Controls**: Choose from photorealistic, artistic, cartoon styles
-        - **Quality Settings**: Standard to professional quality
-        - **Aspect Ratios**: Square, portrait, landscape, wide formats
-        - **Quick Ideas**: Pre-made prompts to get started
-        - **Conversation History**: Track all your generations
-        """)
+    image_generation.render()
 
 with tab2:
-    st.header("✏️ General Image Editing")
-    if api_ready:
-        st.info("🚧 Image editing features coming soon!")
-        st.markdown("### Planned Features:")
-        st.markdown("""
-        - **Background Replacement**: Change backgrounds with AI
-        - **Object Removal**: Remove unwanted elements
-        - **Object Addition**: Add new elements to images
-        - **Style Transfer**: Apply artistic styles
-        - **Smart Cropping**: AI-powered composition
-        """)
-    else:
-        st.warning("⚠️ Please configure your Gemini API key in the sidebar first.")
+    image_editing.render()
 
 with tab3:
-    st.header("👤 Face & Body Modification")
-    if api_ready:
-        st.info("🚧 Face & body editing features coming soon!")
-        st.markdown("### Planned Features:")
-        st.markdown("""
-        - **Facial Expression Changes**: Modify emotions and expressions
-        - **Body Type Adjustments**: Change body proportions
-        - **Age Progression/Regression**: Make subjects older or younger
-        - **Style Changes**: Modify appearance while preserving identity
-        - **Professional Retouching**: AI-powered enhancement
-        """)
-    else:
-        st.warning("⚠️ Please configure your Gemini API key in the sidebar first.")
+    face_body.render()
 
 with tab4:
-    st.header("📸 Professional Headshots")
-    if api_ready:
-        st.info("🚧 Headshot generation features coming soon!")
-        st.markdown("### Planned Features:")
-        st.markdown("""
-        - **Professional Styling**: Convert casual photos to professional headshots
-        - **Background Options**: Studio, office, or custom backgrounds
-        - **Lighting Enhancement**: Professional portrait lighting
-        - **Clothing Suggestions**: Professional attire recommendations
-        - **Multiple Variations**: Generate different styles from one photo
-        """)
-    else:
-        st.warning("⚠️ Please configure your Gemini API key in the sidebar first.")
+    headshot_studio.render()
 
 # Footer
 st.divider()
@@ -229,3 +242,6 @@ with col_footer3:
         st.markdown("3. Start generating images!")
     else:
         st.markdown("✅ Ready to use all features!")
+
+observe("rerun", time.perf_counter() - rerun_started)
+mark_first_run_complete()
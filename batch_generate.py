@@ -0,0 +1,246 @@
+"""Headless batch generation from a CSV or JSONL file of prompts
+
+Each row needs a `prompt` and may select presets from config/config.py by
+group: style, aspect_ratio, clothing, pose, expression, background, face,
+body (several options separated by "|" in CSV, or a list in JSONL). Optional
+columns: `id` (output file stem, suffixed with the row number so equal ids
+never overwrite each other) and `quality_boost` (default true).
+
+Images are written to OUT_DIR as they finish and recorded in
+OUT_DIR/manifest.jsonl. OUT_DIR/checkpoint.json tracks completed rows, so
+re-running the same command after a crash continues where it stopped; rows
+with any failed variation are retried on the next run.
+
+    python batch_generate.py prompts.csv --out results --concurrency 4
+"""
+import os
+import re
+import csv
+import sys
+import json
+import time
+import argparse
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from config.settings import Settings
+from utils.gemini_client import GeminiClient
+from utils.prompt_compiler import PRESET_GROUPS, compile_prompt
+
+MANIFEST_NAME = "manifest.jsonl"
+CHECKPOINT_NAME = "checkpoint.json"
+
+_UNSAFE_STEM = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def read_rows(path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (row number, row) one at a time; CSV or JSONL by file extension"""
+    with open(path, newline="", encoding="utf-8") as source:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            row_number = 0
+            for line in source:
+                if line.strip():
+                    yield row_number, json.loads(line)
+                    row_number += 1
+        else:
+            yield from enumerate(csv.DictReader(source))
+
+
+def row_selections(row: Dict[str, Any]) -> Dict[str, Any]:
+    selections = {}
+    for group in PRESET_GROUPS:
+        value = row.get(group)
+        if isinstance(value, str):
+            value = [option.strip() for option in value.split("|") if option.strip()]
+        if value:
+            selections[group] = value
+    return selections
+
+
+def row_quality_boost(row: Dict[str, Any]) -> bool:
+    value = row.get("quality_boost", True)
+    if isinstance(value, str):
+        return value.strip().lower() not in ("0", "false", "no", "")
+    return bool(value)
+
+
+def row_stem(row_number: int, row: Dict[str, Any]) -> str:
+    """Output file stem; a function of the row alone, so it is the same on every run"""
+    row_id = str(row.get("id") or "").strip()
+    if not row_id:
+        return f"row-{row_number:06d}"
+    # Ids may repeat, also after sanitizing or on case-insensitive filesystems
+    return f"{_UNSAFE_STEM.sub('_', row_id)}-{row_number:06d}"
+
+
+class Checkpoint:
+    """Processed rows as a contiguous watermark plus the few finished beyond it
+
+    Rows finish out of order, so "everything up to N" alone would lose work;
+    the extra set stays no larger than the number of requests in flight.
+    Failed rows move the watermark too but are listed in `failed`, so the
+    next run retries them.
+    """
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.watermark = -1
+        self.done: Set[int] = set()
+        self.failed: Set[int] = set()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("source") != self.source:
+            raise SystemExit(f"{self.path} belongs to {state.get('source')}, not {self.source}")
+        self.watermark = state["watermark"]
+        self.done = set(state["done"])
+        self.failed = set(state.get("failed", []))
+
+    def is_done(self, row_number: int) -> bool:
+        if row_number in self.failed:
+            return False
+        return row_number <= self.watermark or row_number in self.done
+
+    def mark_done(self, row_number: int):
+        self.failed.discard(row_number)
+        self._processed(row_number)
+
+    def mark_failed(self, row_number: int):
+        self.failed.add(row_number)
+        self._processed(row_number)
+
+    def _processed(self, row_number: int):
+        if row_number <= self.watermark:
+            # A retried row behind the watermark
+            return
+        self.done.add(row_number)
+        while self.watermark + 1 in self.done:
+            self.watermark += 1
+            self.done.remove(self.watermark)
+
+    def save(self):
+        # Write-then-rename so a crash never leaves a truncated checkpoint
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "watermark": self.watermark, "done": sorted(self.done),
+                       "failed": sorted(self.failed)}, f)
+        os.replace(temp_path, self.path)
+
+
+def run(source: str, out_dir: str, client: GeminiClient, concurrency: int,
+        variations: int = 1, limit: Optional[int] = None) -> Dict[str, int]:
+    """Generate every pending row of source into out_dir; returns counters"""
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = Checkpoint(os.path.join(out_dir, CHECKPOINT_NAME), source)
+    checkpoint.load()
+
+    # Only rows with requests in flight are held here, so memory stays flat
+    in_flight: Dict[int, Tuple[int, str, Dict[str, Any], Tuple[str, ...]]] = {}
+    remaining: Dict[int, int] = {}
+    failed_rows: Set[int] = set()
+    counters = {"rows": 0, "images": 0, "errors": 0, "skipped": 0, "failed_rows": 0}
+
+    manifest = open(os.path.join(out_dir, MANIFEST_NAME), "a", encoding="utf-8")
+
+    def record(entry: Dict[str, Any]):
+        manifest.write(json.dumps(entry) + "\n")
+        manifest.flush()
+
+    def finish_row(row_number: int, ok: bool):
+        # Manifest first: after a crash a row may be redone, never lost
+        if ok:
+            checkpoint.mark_done(row_number)
+        else:
+            checkpoint.mark_failed(row_number)
+            counters["failed_rows"] += 1
+        checkpoint.save()
+
+    def prompts() -> Iterator[str]:
+        batch_index = 0
+        for row_number, row in read_rows(source):
+            if limit is not None and counters["rows"] >= limit:
+                return
+            if checkpoint.is_done(row_number):
+                counters["skipped"] += 1
+                continue
+            counters["rows"] += 1
+            try:
+                compiled = compile_prompt(str(row.get("prompt", "")), row_selections(row), row_quality_boost(row))
+            except ValueError as e:
+                # Unknown preset names: report the row and carry on
+                record({"row": row_number, "id": row.get("id"), "status": "error", "error": str(e),
+                        "finished_at": time.time()})
+                counters["errors"] += 1
+                finish_row(row_number, ok=False)
+                continue
+            in_flight[batch_index] = (row_number, row_stem(row_number, row), row, compiled.dropped)
+            remaining[row_number] = variations
+            batch_index += 1
+            yield compiled.text
+
+    with manifest:
+        for item in client.generate_batch(prompts(), variations, concurrency):
+            row_number, stem, row, dropped = in_flight[item.index]
+            entry = {
+                "row": row_number,
+                "id": row.get("id"),
+                "variation": item.variation,
+                "prompt": item.prompt,
+                # Preset phrases left out as duplicates or over the token budget
+                "dropped": list(dropped),
+                "finished_at": time.time(),
+            }
+            if item.ok:
+                if variations > 1:
+                    stem = f"{stem}-v{item.variation + 1}"
+                file_name = item.image.file_name(stem)
+                with open(os.path.join(out_dir, file_name), "wb") as image_file:
+                    image_file.write(item.image.data)
+                entry.update(status="ok", file=file_name, mime_type=item.image.mime_type,
+                             bytes=item.image.nbytes)
+                counters["images"] += 1
+            else:
+                entry.update(status="error", error=item.error)
+                counters["errors"] += 1
+                failed_rows.add(row_number)
+            record(entry)
+
+            remaining[row_number] -= 1
+            if remaining[row_number] == 0:
+                del remaining[row_number]
+                del in_flight[item.index]
+                finish_row(row_number, ok=row_number not in failed_rows)
+                failed_rows.discard(row_number)
+            print(f"row {row_number} v{item.variation + 1}: {entry['status']}", flush=True)
+
+    return counters
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="CSV or JSONL file of prompts")
+    parser.add_argument("--out", required=True, help="output directory (also holds manifest and checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=Settings.BATCH_MAX_CONCURRENCY)
+    parser.add_argument("--variations", type=int, default=1, help="images per row")
+    parser.add_argument("--limit", type=int, help="stop after this many rows")
+    parser.add_argument("--api-key", help="defaults to GEMINI_API_KEY from secrets or environment")
+    args = parser.parse_args(argv)
+
+    api_key = args.api_key or Settings.get_gemini_api_key()
+    if not api_key or not Settings.validate_api_key(api_key):
+        parser.error("a valid Gemini API key is required (--api-key or GEMINI_API_KEY)")
+
+    started = time.perf_counter()
+    counters = run(args.source, args.out, GeminiClient(api_key), args.concurrency, args.variations, args.limit)
+    print(
+        f"{counters['rows']} rows, {counters['images']} images, {counters['errors']} errors "
+        f"({counters['failed_rows']} rows to retry), {counters['skipped']} already done in {time.perf_counter() - started:.1f}s"
+    )
+    return 1 if counters["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""Local stand-in for the Gemini and Hugging Face HTTP APIs
+
+Serves canned images with configurable latency and error distributions so
+GeminiClient and ImageGenerator can be benchmarked without network access.
+
+    python -m benchmarks.fake_server --port 8765 --latency-ms 800 --error-rate 0.05
+"""
+import io
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+class FakeServerConfig:
+    """Response behaviour shared by all handler threads"""
+
+    def __init__(self, image_size: int = 1024, latency_ms: float = 0.0, latency_sigma: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, retry_after: float = 0.0):
+        self.image_size = image_size
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma  # lognormal spread around the median latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._images: Dict[Tuple[int, str], bytes] = {}
+
+    def sample_latency(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.latency_sigma <= 0:
+            return self.latency_ms / 1000.0
+        return random.lognormvariate(np.log(self.latency_ms / 1000.0), self.latency_sigma)
+
+    def canned_image(self, fmt: str = "PNG") -> bytes:
+        """Noisy gradient image; noise keeps encoded sizes realistic"""
+        key = (self.image_size, fmt)
+        with self._lock:
+            data = self._images.get(key)
+        if data is None:
+            size = self.image_size
+            rng = np.random.default_rng(size)
+            gradient = np.linspace(0, 255, size, dtype=np.float32)
+            pixels = np.stack([
+                np.broadcast_to(gradient, (size, size)),
+                np.broadcast_to(gradient[:, None], (size, size)),
+                np.full((size, size), 128, dtype=np.float32),
+            ], axis=-1)
+            pixels += rng.normal(0, 12, pixels.shape).astype(np.float32)
+            buffer = io.BytesIO()
+            Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format=fmt)
+            data = buffer.getvalue()
+            with self._lock:
+                self._images[key] = data
+        return data
+
+    def count(self, error: bool):
+        with self._lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: FakeServerConfig = FakeServerConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _maybe_fail(self) -> bool:
+        if random.random() >= self.config.error_rate:
+            self.config.count(error=False)
+            return False
+        self.config.count(error=True)
+        body = json.dumps({"error": {"code": self.config.error_status, "message": "fake overload",
+                                     "status": "UNAVAILABLE"}}).encode()
+        self._send(self.config.error_status, body, "application/json",
+                   {"Retry-After": str(self.config.retry_after)})
+        return True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        time.sleep(self.config.sample_latency())
+        if self._maybe_fail():
+            return
+
+        if ":streamGenerateContent" in self.path:
+            self._gemini_stream()
+        elif ":generateContent" in self.path:
+            self._gemini()
+        else:
+            # Anything else is treated as a Hugging Face inference call
+            self._send(200, self.config.canned_image("JPEG"), "image/jpeg")
+
+    def _gemini_payload(self, parts) -> bytes:
+        return json.dumps({
+            "candidates": [{"content": {"role": "model", "parts": parts}, "finishReason": "STOP"}]
+        }).encode()
+
+    def _image_part(self) -> Dict:
+        data = base64.b64encode(self.config.canned_image("PNG")).decode()
+        return {"inlineData": {"mimeType": "image/png", "data": data}}
+
+    def _gemini(self):
+        parts = [{"text": "Here is your image."}, self._image_part()]
+        self._send(200, self._gemini_payload(parts), "application/json")
+
+    def _gemini_stream(self):
+        # Server-sent events: a text chunk first, then the image
+        chunks = [
+            self._gemini_payload([{"text": "Here is your image."}]),
+            self._gemini_payload([self._image_part()]),
+        ]
+        body = b"".join(b"data: " + chunk + b"\r\n\r\n" for chunk in chunks)
+        self._send(200, body, "text/event-stream")
+
+
+def start_fake_server(config: FakeServerConfig, port: int = 0) -> ThreadingHTTPServer:
+    """Start the fake API on localhost in a daemon thread; port 0 picks a free port"""
+    handler = type("ConfiguredFakeApiHandler", (FakeApiHandler,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-api", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--image-size", type=int, default=1024)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    config = FakeServerConfig(args.image_size, args.latency_ms, args.latency_sigma,
+                              args.error_rate, args.error_status)
+    server = start_fake_server(config, args.port)
+    print(f"Fake Gemini/HF API on http://127.0.0.1:{server.server_address[1]}")
+    print(f"  GEMINI_BASE_URL=http://127.0.0.1:{server.server_address[1]}")
+    print(f"  HF_API_URL=http://127.0.0.1:{server.server_address[1]}/models/fake")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
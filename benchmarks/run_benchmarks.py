@@ -0,0 +1,202 @@
+"""Offline benchmark harness
+
+Drives GeminiClient, ImageGenerator and ImageUtils against the local fake API
+server and reports throughput, p50/p95/p99 latency, peak RSS and
+encode/decode costs across concurrency levels and image sizes.
+
+    python -m benchmarks.run_benchmarks --concurrency 1,4,16 --sizes 512,1024 --requests 64
+"""
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import resource
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from benchmarks.fake_server import FakeServerConfig, start_fake_server
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_load(fn: Callable[[int], Any], requests: int, concurrency: int) -> Dict[str, float]:
+    """Call fn(i) `requests` times with `concurrency` workers and summarize latencies"""
+    latencies: List[float] = []
+    errors = 0
+
+    def timed(i: int):
+        started = time.perf_counter()
+        try:
+            ok = fn(i) is not None
+        except Exception:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency, ok in pool.map(timed, range(requests)):
+            latencies.append(latency)
+            errors += not ok
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': requests / wall,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def time_op(fn: Callable[[], Any], repeats: int) -> float:
+    """Mean milliseconds per call"""
+    started = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - started) / repeats * 1000
+
+
+def bench_codecs(config: FakeServerConfig, repeats: int) -> Dict[str, float]:
+    from PIL import Image
+    from utils.image_utils import ImageUtils
+    from config.settings import Settings
+    from utils.encoding import get_encoder
+    from utils.preprocess import get_preprocessor
+
+    png = config.canned_image("PNG")
+    jpeg = config.canned_image("JPEG")
+    image = Image.open(io.BytesIO(png))
+    image.load()
+
+    def encode(fmt: str, **params):
+        def run():
+            buffer = io.BytesIO()
+            image.save(buffer, format=fmt, **params)
+        return run
+
+    def decode(data: bytes):
+        def run():
+            Image.open(io.BytesIO(data)).load()
+        return run
+
+    preprocessor = get_preprocessor()
+    encoder = get_encoder()
+
+    def preprocess_uncached():
+        # Bypass the content-hash cache so every call does the real work
+        preprocessor._normalize(jpeg, preprocessor.target_size)
+
+    return {
+        'png_encode_ms': time_op(encode("PNG"), repeats),
+        'jpeg_encode_ms': time_op(encode("JPEG", quality=85), repeats),
+        'webp_encode_ms': time_op(encode("WEBP", quality=80), repeats),
+        'png_decode_ms': time_op(decode(png), repeats),
+        'jpeg_decode_ms': time_op(decode(jpeg), repeats),
+        'base64_png_ms': time_op(lambda: ImageUtils.image_to_base64(image, "png"), repeats),
+        'preview_encode_uncached_ms': time_op(
+            lambda: encoder._encode(image, Settings.PREVIEW_FORMAT, 'preview', Settings.PREVIEW_MAX_SIZE), repeats
+        ),
+        'preprocess_jpeg_ms': time_op(preprocess_uncached, repeats),
+        'png_bytes': len(png),
+        'jpeg_bytes': len(jpeg),
+    }
+
+
+def configure_environment(base_url: str, cache_dir: str):
+    """Point the app at the fake server; must run before importing config.settings"""
+    os.environ['GEMINI_BASE_URL'] = base_url
+    os.environ['HF_API_URL'] = f"{base_url}/models/fake"
+    os.environ['AI_IMAGE_EDITOR_CACHE_DIR'] = cache_dir
+    os.environ['AI_IMAGE_EDITOR_HISTORY_DIR'] = os.path.join(cache_dir, 'history')
+    os.environ['AI_IMAGE_EDITOR_ATLAS_DIR'] = os.path.join(cache_dir, 'atlas')
+    # Measure the client, not our own quota protection
+    os.environ.setdefault('GEMINI_REQUESTS_PER_MINUTE', '1000000')
+    os.environ.setdefault('GEMINI_REQUEST_BURST', '1000000')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated worker counts")
+    parser.add_argument("--sizes", default="512,1024", help="comma-separated image edge lengths")
+    parser.add_argument("--requests", type=int, default=64, help="requests per scenario")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="median fake API latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="lognormal latency spread")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument("--codec-repeats", type=int, default=5)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    concurrencies = [int(c) for c in args.concurrency.split(",")]
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    config = FakeServerConfig(sizes[0], args.latency_ms, args.latency_sigma, args.error_rate, retry_after=0.0)
+    server = start_fake_server(config)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    configure_environment(base_url, tempfile.mkdtemp(prefix="ai-image-editor-bench-"))
+
+    from utils.gemini_client import GeminiClient
+    from utils.image_generator import ImageGenerator
+    from utils.progress import GenerationProgress
+
+    client = GeminiClient("AIza-benchmark-key-000000000000000000")
+    generator = ImageGenerator()
+    run_id = uuid.uuid4().hex[:8]
+
+    scenarios: Dict[str, Callable[[int], Any]] = {
+        # Unique prompts so every request reaches the (fake) network
+        'gemini': lambda i: client.generate_image_or_raise(f"bench {run_id} {time.perf_counter_ns()} {i}"),
+        'gemini_stream': lambda i: client.generate_image_or_raise(
+            f"bench stream {run_id} {time.perf_counter_ns()} {i}", GenerationProgress()
+        ),
+        # Same prompt every time: measures the cache hit path
+        'gemini_cached': lambda i: client.generate_image_or_raise(f"bench cached {run_id}"),
+        'huggingface': lambda i: generator.fetch_huggingface(f"bench {i}"),
+    }
+
+    results: List[Dict[str, Any]] = []
+    for size in sizes:
+        config.image_size = size
+        codecs = bench_codecs(config, args.codec_repeats)
+        results.append({'scenario': 'codecs', 'size': size, **codecs})
+        for name, fn in scenarios.items():
+            for concurrency in concurrencies:
+                row = run_load(fn, args.requests, concurrency)
+                results.append({'scenario': name, 'size': size, 'concurrency': concurrency, **row})
+                print(
+                    f"{name:14s} size={size:5d} c={concurrency:3d} "
+                    f"rps={row['throughput_rps']:8.1f} p50={row['p50_ms']:8.1f}ms "
+                    f"p95={row['p95_ms']:8.1f}ms p99={row['p99_ms']:8.1f}ms "
+                    f"errors={row['errors']:3d} rss={row['peak_rss_mb']:.0f}MB",
+                    flush=True,
+                )
+        print(f"codecs         size={size:5d} " + " ".join(
+            f"{key}={value:.1f}" for key, value in codecs.items()
+        ), flush=True)
+
+    server.shutdown()
+    print(f"fake server handled {config.requests} requests ({config.errors} injected errors)")
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump(results, out, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,4 @@
 # Configuration file for AI Image Studio Pro
-import streamlit as st
-from google import genai
-from google.genai import types
 
 # Model configuration
 MODEL_ID = "gemini-2.5-flash-image-preview"
@@ -89,12 +86,19 @@ BODY_MODIFICATIONS = {
     "Clothing Fit": "perfectly fitted clothing, tailored professional appearance"
 }
 
-@st.cache_resource
 def get_client():
-    """Initialize Gemini client with error handling"""
+    """Initialize Gemini client with error handling
+
+    Streamlit and the SDK are imported here rather than at module level so that
+    importing the preset dictionaries stays cheap; the client registry already
+    caches one client per key for the whole process.
+    """
+    import streamlit as st
+    from utils.client_pool import get_genai_client
+
     try:
         api_key = st.secrets["GOOGLE_API_KEY"]
-        return genai.Client(api_key=api_key)
+        return get_genai_client(api_key)
     except Exception as e:
         st.error(f"Failed to initialize AI client: {str(e)}")
         st.stop()
@@ -1,4 +1,6 @@
 import os
+import tempfile
+import functools
 import streamlit as st
 from typing import Optional
 
@@ -7,32 +9,166 @@ class Settings:
     
     # API Configuration
     GEMINI_MODEL = "gemini-1.5-flash"
+    GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL')  # None uses the SDK default endpoint
+    HF_API_URL = os.getenv(
+        'HF_API_URL',
+        "https://api-inference.huggingface.co/models/runwayml/stable-diffusion-v1-5"
+    )
+    HF_IMAGE_SIZE = (
+        int(os.getenv('HF_IMAGE_WIDTH', 512)),
+        int(os.getenv('HF_IMAGE_HEIGHT', 512))
+    )
     
     # Image settings
     MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
-    SUPPORTED_FORMATS = ["jpg", "jpeg", "png", "webp"]
+    SUPPORTED_FORMATS = ["jpg", "jpeg", "png", "webp", "avif"]  # AVIF only where Pillow supports it
+    MAX_IMAGE_PIXELS = 100_000_000  # reject uploads above 100 MP before decoding
+    MODEL_INPUT_SIZE = (1024, 1024)  # uploads are downscaled to fit within this
+    PREPROCESS_WORKERS = 2
+    PREPROCESS_CACHE_ENTRIES = 32
+    PHASH_INDEX_DIR = os.getenv(
+        'AI_IMAGE_EDITOR_PHASH_DIR',
+        os.path.join(tempfile.gettempdir(), 'ai-image-editor-phash')
+    )
+    PHASH_DUPLICATE_DISTANCE = 4  # bits of 64; a session's uploads this close are flagged as near-duplicates
+    PHASH_SIMILAR_DISTANCE = 10  # bits of 64 for "similar images" in history
+    
+    # Output encoding
+    PREVIEW_FORMAT = "webp"  # what the browser is sent for display
+    PREVIEW_MAX_SIZE = (1024, 1024)
+    DOWNLOAD_FORMAT = "png"  # default download format when converting
+    ENCODE_QUALITY = {'preview': 75, 'standard': 85, 'high': 95}  # lossy quality per tier
+    ENCODE_WORKERS = 2
+    ENCODE_CACHE_BYTES = int(os.getenv('AI_IMAGE_EDITOR_ENCODE_CACHE_BYTES', 64 * 1024 * 1024))  # 64MB
+    
+    # Tiled processing of large images
+    TILE_SIZE = 1024
+    TILE_OVERLAP = 64  # pixels shared by neighbouring tiles and feathered together
+    TILE_WORKERS = 2
+    TILE_SCRATCH_DIR = os.getenv(
+        'AI_IMAGE_EDITOR_TILE_DIR',
+        os.path.join(tempfile.gettempdir(), 'ai-image-editor-tiles')
+    )
+    TILE_SCRATCH_MAX_AGE = 6 * 3600  # seconds; older scratch files are left over from dead processes
+    
+    # Process pool for CPU-bound pixel work (resize, convert, encode)
+    PROCESS_POOL_WORKERS = int(os.getenv('AI_IMAGE_EDITOR_PROCESS_WORKERS', max(1, (os.cpu_count() or 2) - 1)))  # 0 keeps everything in-process
+    PROCESS_POOL_MAX_PENDING = 32  # submitters block beyond this many queued tasks
+    PROCESS_POOL_MAX_TASKS_PER_CHILD = 200  # workers are replaced after this many tasks
+    PROCESS_POOL_MIN_PIXELS = 1_000_000  # smaller images are cheaper to process in-thread
+    PROCESS_POOL_SUBMIT_TIMEOUT = 30.0  # seconds to wait for a free slot before failing
     
     # Conversation settings
     MAX_CONVERSATION_LENGTH = 20
+    EDIT_HISTORY_TOKEN_BUDGET = 400  # approximate tokens of earlier turns resent with each edit
+    EDIT_FILE_TTL_SECONDS = 46 * 3600  # the Files API keeps uploads for 48 hours
+    
+    # History settings
+    HISTORY_MAX_ITEMS = 20  # per history type, per session
+    HISTORY_DIR = os.getenv(
+        'AI_IMAGE_EDITOR_HISTORY_DIR',
+        os.path.join(tempfile.gettempdir(), 'ai-image-editor-history')
+    )
+    HISTORY_BLOB_TTL_SECONDS = 3 * 24 * 3600  # 3 days
+    HISTORY_THUMBNAIL_SIZE = (256, 256)
+    HISTORY_MEMORY_LIMIT = int(os.getenv('AI_IMAGE_EDITOR_HISTORY_MEMORY_LIMIT', 64 * 1024 * 1024))  # 64MB of encoded gallery rows
+    HISTORY_ATLAS_DIR = os.getenv(
+        'AI_IMAGE_EDITOR_ATLAS_DIR',
+        os.path.join(tempfile.gettempdir(), 'ai-image-editor-atlas')
+    )
+    HISTORY_ATLAS_SLOTS = 1024  # thumbnails kept on disk, reused oldest first
+    GALLERY_COLUMNS = 4
+    
+    # Generation cache settings
+    CACHE_DIR = os.getenv(
+        'AI_IMAGE_EDITOR_CACHE_DIR',
+        os.path.join(tempfile.gettempdir(), 'ai-image-editor-cache')
+    )
+    CACHE_MAX_BYTES = int(os.getenv('AI_IMAGE_EDITOR_CACHE_MAX_BYTES', 512 * 1024 * 1024))  # 512MB
+    CACHE_TTL_SECONDS = int(os.getenv('AI_IMAGE_EDITOR_CACHE_TTL_SECONDS', 7 * 24 * 3600))  # 7 days
+    
+    # Background generation jobs
+    JOB_MAX_WORKERS = int(os.getenv('AI_IMAGE_EDITOR_JOB_WORKERS', 4))
+    JOB_MAX_PENDING = int(os.getenv('AI_IMAGE_EDITOR_JOB_MAX_PENDING', 32))
+    JOB_RETENTION_SECONDS = 15 * 60  # keep finished results for 15 minutes
+    JOB_POLL_INTERVAL = 1.5  # seconds between status refreshes in the UI
+    
+    # Per API key rate limit and batch generation
+    GEMINI_REQUESTS_PER_MINUTE = float(os.getenv('GEMINI_REQUESTS_PER_MINUTE', 10))
+    GEMINI_REQUEST_BURST = float(os.getenv('GEMINI_REQUEST_BURST', 3))
+    RATE_LIMIT_MAX_WAIT = float(os.getenv('AI_IMAGE_EDITOR_RATE_LIMIT_MAX_WAIT', 300))  # seconds queued before giving up
+    BATCH_MAX_CONCURRENCY = 4
+    
+    # Shared HTTP connection pool per API key
+    HTTP_MAX_CONNECTIONS = int(os.getenv('AI_IMAGE_EDITOR_HTTP_MAX_CONNECTIONS', 32))
+    HTTP_MAX_KEEPALIVE = int(os.getenv('AI_IMAGE_EDITOR_HTTP_MAX_KEEPALIVE', 16))
+    HTTP_KEEPALIVE_EXPIRY = 60.0  # seconds
+    
+    # Retry, backoff and circuit breaker for image backends
+    RETRY_MAX_ATTEMPTS = int(os.getenv('AI_IMAGE_EDITOR_RETRY_MAX_ATTEMPTS', 3))
+    RETRY_BASE_DELAY = 1.0  # seconds, doubled per attempt (with jitter)
+    RETRY_MAX_DELAY = 30.0  # seconds; longer Retry-After values fail fast instead
+    BREAKER_FAILURE_THRESHOLD = 5
+    BREAKER_RECOVERY_SECONDS = 30.0
+    HEDGE_AFTER_SECONDS = float(os.environ['AI_IMAGE_EDITOR_HEDGE_AFTER']) if os.getenv('AI_IMAGE_EDITOR_HEDGE_AFTER') else None
+    
+    # Instrumentation
+    METRICS_PORT = int(os.getenv('AI_IMAGE_EDITOR_METRICS_PORT', 0))  # 0 disables the /metrics endpoint
+    METRICS_LOG_PATH = os.getenv('AI_IMAGE_EDITOR_METRICS_LOG')  # JSON lines, one per span
+    METRICS_SESSION_WINDOW = 200  # recent spans kept per session for the Debug Info breakdown
+    METRICS_MAX_SESSIONS = 1000
+    
+    # Provider routing
+    ROUTER_WINDOW = 50  # recent calls per provider used for latency/error stats
+    ROUTER_ERROR_PENALTY = 4.0  # how strongly error rate inflates a provider's score
+    
+    # Prompt compilation
+    PROMPT_TOKEN_BUDGET = int(os.getenv('AI_IMAGE_EDITOR_PROMPT_TOKEN_BUDGET', 120))  # approximate, for preset and quality fragments; the user's own text is not counted
     
     @staticmethod
-    def get_gemini_api_key() -> Optional[str]:
-        """Get Gemini API key from secrets, environment, or session state"""
-        # First try Streamlit secrets
+    @functools.lru_cache(maxsize=None)
+    def _secret(name: str) -> Optional[str]:
+        """Read a Streamlit secret once per process (None if missing or secrets unavailable)"""
         try:
-            if "GEMINI_API_KEY" in st.secrets:
-                return st.secrets["GEMINI_API_KEY"]
+            if name in st.secrets:
+                return st.secrets[name]
         except:
             pass
+        return None
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _process_gemini_api_key() -> Optional[str]:
+        """Gemini API key from secrets or environment, resolved once per process"""
+        # First try Streamlit secrets
+        secret_key = Settings._secret("GEMINI_API_KEY")
+        if secret_key is not None:
+            return secret_key
         
         # Then try environment variable
-        env_key = os.getenv('GEMINI_API_KEY')
-        if env_key:
-            return env_key
+        return os.getenv('GEMINI_API_KEY') or None
+    
+    @staticmethod
+    def clear_cache():
+        """Forget memoized secrets/environment lookups, e.g. after editing secrets.toml"""
+        Settings._secret.cache_clear()
+        Settings._process_gemini_api_key.cache_clear()
+    
+    @staticmethod
+    def get_gemini_api_key() -> Optional[str]:
+        """Get Gemini API key from secrets, environment, or session state"""
+        process_key = Settings._process_gemini_api_key()
+        if process_key is not None:
+            return process_key
         
         # Finally try session state (manual input)
         return st.session_state.get('gemini_api_key')
     
+    @staticmethod
+    def get_hf_token() -> Optional[str]:
+        """Get Hugging Face token from secrets or environment"""
+        return Settings._secret("HF_TOKEN") or os.getenv('HF_TOKEN')
+    
     @staticmethod
     def validate_api_key(api_key: str) -> bool:
         """Basic API key validation"""
@@ -41,7 +177,4 @@ class Settings:
     @staticmethod
     def has_api_key_in_secrets() -> bool:
         """Check if API key is available in secrets"""
-        try:
-            return "GEMINI_API_KEY" in st.secrets and bool(st.secrets["GEMINI_API_KEY"])
-        except:
-            return False
+        return bool(Settings._secret("GEMINI_API_KEY"))
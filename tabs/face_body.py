@@ -0,0 +1,18 @@
+import streamlit as st
+
+@st.fragment
+def render():
+    """Face & Body tab, rendered as a fragment so its widgets only rerun this tab"""
+    st.header("👤 Face & Body Modification")
+    if st.session_state.get('gemini_client') is not None:
+        st.info("🚧 Face & body editing features coming soon!")
+        st.markdown("### Planned Features:")
+        st.markdown("""
+        - **Facial Expression Changes**: Modify emotions and expressions
+        - **Body Type Adjustments**: Change body proportions
+        - **Age Progression/Regression**: Make subjects older or younger
+        - **Style Changes**: Modify appearance while preserving identity
+        - **Professional Retouching**: AI-powered enhancement
+        """)
+    else:
+        st.warning("⚠️ Please configure your Gemini API key in the sidebar first.")
@@ -0,0 +1,18 @@
+import streamlit as st
+
+@st.fragment
+def render():
+    """Headshot Studio tab, rendered as a fragment so its widgets only rerun this tab"""
+    st.header("📸 Professional Headshots")
+    if st.session_state.get('gemini_client') is not None:
+        st.info("🚧 Headshot generation features coming soon!")
+        st.markdown("### Planned Features:")
+        st.markdown("""
+        - **Professional Styling**: Convert casual photos to professional headshots
+        - **Background Options**: Studio, office, or custom backgrounds
+        - **Lighting Enhancement**: Professional portrait lighting
+        - **Clothing Suggestions**: Professional attire recommendations
+        - **Multiple Variations**: Generate different styles from one photo
+        """)
+    else:
+        st.warning("⚠️ Please configure your Gemini API key in the sidebar first.")
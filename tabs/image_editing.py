@@ -0,0 +1,18 @@
+import streamlit as st
+
+@st.fragment
+def render():
+    """Edit Images tab, rendered as a fragment so its widgets only rerun this tab"""
+    st.header("✏️ General Image Editing")
+    if st.session_state.get('gemini_client') is not None:
+        st.info("🚧 Image editing features coming soon!")
+        st.markdown("### Planned Features:")
+        st.markdown("""
+        - **Background Replacement**: Change backgrounds with AI
+        - **Object Removal**: Remove unwanted elements
+        - **Object Addition**: Add new elements to images
+        - **Style Transfer**: Apply artistic styles
+        - **Smart Cropping**: AI-powered composition
+        """)
+    else:
+        st.warning("⚠️ Please configure your Gemini API key in the sidebar first.")
@@ -1,12 +1,37 @@
 import streamlit as st
 from utils.gemini_client import GeminiClient
-import io
+from utils.history_store import get_history_store
+from utils.encoding import get_encoder, offered_formats
+from utils.instrumentation import span
+from utils.job_queue import get_job_queue, session_jobs, QueueFullError, QUEUED, RUNNING, DONE, CANCELLED
+from utils.progress import GenerationProgress
+from utils.providers import build_router
+from utils.utils import save_to_history
+from config.settings import Settings
 
+@st.fragment
 def render():
+    """Generate tab; a fragment, so its widgets rerun only this tab"""
     if not st.session_state.get('gemini_client'):
-        st.warning("Configure API key first")
+        st.warning("⚠️ Please configure your Gemini API key in the sidebar first.")
+        st.info("Once connected, you'll be able to generate images with AI!")
+        
+        # Show preview of what's coming
+        st.markdown("### 🎨 Image Generation Features:")
+        st.markdown("""
+        - **Natural Language Prompts**: Describe images in plain English
+        - **Style Controls**: Choose from photorealistic, artistic, cartoon styles
+        - **Quality Settings**: Standard to professional quality
+        - **Aspect Ratios**: Square, portrait, landscape, wide formats
+        - **Quick Ideas**: Pre-made prompts to get started
+        - **Conversation History**: Track all your generations
+        """)
         return
     
+    with span("render.generate_tab"):
+        _render_generate()
+
+def _render_generate():
     client = st.session_state.gemini_client
     
     st.header("Generate Images")
@@ -15,21 +40,162 @@ def render():
     prompt = st.text_area("Describe your image:", height=100)
     
     if st.button("Generate Image", type="primary") and prompt:
-        with st.spinner("Generating..."):
-            image = client.generate_image(prompt)
+        # Run in the background so reruns don't throw the result away
+        router = build_router(client, Settings.get_hf_token())
+        progress = GenerationProgress()
+        try:
+            job_id = get_job_queue().submit(router.generate, prompt, progress, label=prompt, progress=progress)
+            session_jobs().insert(0, job_id)
+        except QueueFullError as e:
+            st.warning(str(e))
+    
+    if _has_pending_jobs():
+        _render_jobs_live()
+    else:
+        _render_jobs()
+    
+    _render_gallery()
+
+def _has_pending_jobs() -> bool:
+    queue = get_job_queue()
+    for job_id in session_jobs():
+        job = queue.get(job_id)
+        if job is not None and not job.finished:
+            return True
+    return False
+
+@st.fragment(run_every=Settings.JOB_POLL_INTERVAL)
+def _render_jobs_live():
+    """Poll job status without rerunning the rest of the app"""
+    _render_jobs()
+    if not _has_pending_jobs():
+        # Everything finished: one full rerun switches back to the static view
+        st.rerun()
+
+def _render_jobs():
+    queue = get_job_queue()
+    job_ids = session_jobs()
+    saved_jobs = st.session_state.setdefault('saved_generation_jobs', set())
+    
+    for job_id in list(job_ids):
+        job = queue.get(job_id)
+        if job is None:
+            # Expired from the queue
+            job_ids.remove(job_id)
+            saved_jobs.discard(job_id)
+            continue
+        
+        with st.container(border=True):
+            st.caption(job.label)
             
-        if image:
-            st.success("Image generated!")
-            st.image(image, use_column_width=True)
+            if job.status in (QUEUED, RUNNING):
+                if job.status == QUEUED:
+                    st.info("⏳ Waiting in queue...")
+                else:
+                    st.info(f"🎨 Generating... ({job.elapsed:.0f}s)")
+                    _render_progress(job.progress)
+                # Cancelling also stops a streaming request, so abandoned jobs don't use quota
+                if st.button("Cancel", key=f"cancel_{job_id}"):
+                    queue.cancel(job_id)
+            elif job.status == DONE and job.result is not None:
+                result = job.result
+                if job_id not in saved_jobs:
+                    save_to_history('generation', {'prompt': job.label, 'image': result, 'provider': result.provider})
+                    saved_jobs.add(job_id)
+                st.success(f"Image generated in {job.elapsed:.1f}s via {result.provider or 'cache'}!")
+                # Small preview for display; the original bytes unless another format is chosen
+                encoder = get_encoder()
+                st.image(encoder.preview(result).data, use_column_width=True)
+                if result.text:
+                    st.caption(result.text)
+                
+                formats = offered_formats()
+                original = result.extension if result.extension in formats else None
+                fmt = st.selectbox(
+                    "Download format",
+                    formats,
+                    index=formats.index(original) if original else 0,
+                    key=f"format_{job_id}"
+                )
+                download = encoder.encode(result, fmt, 'high')
+                
+                # Download button
+                st.download_button(
+                    "Download Image",
+                    download.data,
+                    download.file_name("generated_image"),
+                    download.mime_type,
+                    key=f"download_{job_id}"
+                )
+            elif job.status == DONE:
+                st.error("Failed to generate image")
+            elif job.status == CANCELLED:
+                st.warning("Generation cancelled")
+            else:
+                st.error(f"Generation error: {job.error or job.status}")
             
-            # Download button
-            buf = io.BytesIO()
-            image.save(buf, format='PNG')
-            st.download_button(
-                "Download Image",
-                buf.getvalue(),
-                "generated_image.png",
-                "image/png"
-            )
-        else:
-            st.error("Failed to generate image")
+            if job.finished and st.button("Dismiss", key=f"dismiss_{job_id}"):
+                job_ids.remove(job_id)
+                saved_jobs.discard(job_id)
+                queue.forget(job_id)
+                st.rerun()
+
+def _render_progress(progress):
+    """Partial output streamed so far"""
+    if progress is None:
+        return
+    if progress.cancelled:
+        st.caption("Cancelling...")
+    elif progress.status:
+        st.caption(progress.status)
+    if progress.text:
+        st.markdown(progress.text)
+    if progress.preview is not None:
+        st.image(progress.preview.data, caption="Preview", width=256)
+
+@st.fragment
+def _render_gallery():
+    """Recent generations drawn from the thumbnail atlas; a full image loads only when opened"""
+    history = st.session_state.get('generation_history')
+    records = [record for record in history or () if record.digest is not None]
+    if not records:
+        return
+    
+    store = get_history_store()
+    columns = Settings.GALLERY_COLUMNS
+    st.subheader("Recent Generations")
+    
+    for start in range(0, len(records), columns):
+        row = records[start:start + columns]
+        # One image per row instead of one per thumbnail
+        sheet = store.gallery_row(row, columns)
+        if sheet is not None:
+            st.image(sheet.data, use_column_width=True)
+        for offset, (column, record) in enumerate(zip(st.columns(columns), row)):
+            if column.button("Open", key=f"gallery_open_{start + offset}", use_container_width=True):
+                st.session_state.gallery_selected = record.digest
+    
+    selected = st.session_state.get('gallery_selected')
+    record = next((record for record in records if record.digest == selected), None)
+    if record is None:
+        return
+    
+    with st.container(border=True):
+        image = store.load(record)
+        if image is None:
+            st.warning("This image is no longer stored.")
+            return
+        st.image(get_encoder().preview(image).data, use_column_width=True)
+        st.caption(f"{record.meta.get('prompt', '')} ({record.timestamp})")
+        left, right = st.columns(2)
+        left.download_button(
+            "Download Image",
+            image.data,
+            image.file_name("generated_image"),
+            image.mime_type,
+            key="gallery_download",
+            use_container_width=True
+        )
+        if right.button("Close", key="gallery_close", use_container_width=True):
+            del st.session_state.gallery_selected
+            st.rerun(scope="fragment")
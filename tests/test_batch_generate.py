@@ -0,0 +1,100 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from batch_generate import Checkpoint, row_stem, run
+from utils.generated_image import GeneratedImage
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 16
+
+
+class FakeClient:
+    """generate_batch stand-in; prompts containing a word in fail_words fail every variation"""
+
+    def __init__(self, fail_words=()):
+        self.fail_words = set(fail_words)
+        self.requests = 0
+
+    def generate_batch(self, prompts, variations, concurrency):
+        for index, prompt in enumerate(prompts):
+            for variation in range(variations):
+                self.requests += 1
+                ok = not any(word in prompt for word in self.fail_words)
+                yield SimpleNamespace(index=index, variation=variation, prompt=prompt, ok=ok,
+                                      image=GeneratedImage(PNG) if ok else None,
+                                      error=None if ok else "boom")
+
+
+def write_csv(path, rows):
+    path.write_text("id,prompt\n" + "".join(f"{row_id},{prompt}\n" for row_id, prompt in rows))
+    return str(path)
+
+
+def test_checkpoint_watermark_absorbs_out_of_order_rows(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"), "prompts.csv")
+    for row in (2, 0, 3):
+        checkpoint.mark_done(row)
+    assert checkpoint.watermark == 0 and checkpoint.done == {2, 3}
+    checkpoint.mark_done(1)
+    assert checkpoint.watermark == 3 and checkpoint.done == set()
+
+
+def test_checkpoint_failed_rows_advance_watermark_but_stay_pending(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path, "prompts.csv")
+    checkpoint.mark_done(0)
+    checkpoint.mark_failed(1)
+    checkpoint.mark_done(2)
+    assert checkpoint.watermark == 2 and checkpoint.done == set()
+    assert not checkpoint.is_done(1) and checkpoint.is_done(2)
+    checkpoint.save()
+
+    reloaded = Checkpoint(path, "prompts.csv")
+    reloaded.load()
+    assert reloaded.failed == {1} and not reloaded.is_done(1)
+    # A retried row behind the watermark must not grow the done set
+    reloaded.mark_done(1)
+    assert reloaded.is_done(1) and reloaded.done == set() and reloaded.failed == set()
+
+
+def test_checkpoint_rejects_another_source(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    Checkpoint(path, "a.csv").save()
+    with pytest.raises(SystemExit):
+        Checkpoint(path, "b.csv").load()
+
+
+def test_failed_rows_are_retried_on_the_next_run(tmp_path):
+    source = write_csv(tmp_path / "prompts.csv", [("a", "cat"), ("b", "dog"), ("c", "eel")])
+    out = str(tmp_path / "out")
+
+    counters = run(source, out, FakeClient(fail_words={"cat", "dog", "eel"}), concurrency=2)
+    assert counters["failed_rows"] == 3
+
+    client = FakeClient(fail_words={"dog"})
+    counters = run(source, out, client, concurrency=2)
+    assert client.requests == 3 and counters["images"] == 2 and counters["failed_rows"] == 1
+
+    client = FakeClient()
+    counters = run(source, out, client, concurrency=2)
+    assert client.requests == 1 and counters["skipped"] == 2 and counters["images"] == 1
+
+    client = FakeClient()
+    assert run(source, out, client, concurrency=2)["skipped"] == 3 and client.requests == 0
+
+
+def test_equal_ids_write_separate_files(tmp_path):
+    source = write_csv(tmp_path / "prompts.csv", [("a b", "cat"), ("a_b", "dog"), ("A_B", "eel")])
+    out = tmp_path / "out"
+    run(source, str(out), FakeClient(), concurrency=2)
+    manifest = [json.loads(line) for line in (out / "manifest.jsonl").read_text().splitlines()]
+    assert all(entry["dropped"] == [] for entry in manifest)
+    files = {entry["file"] for entry in manifest}
+    assert len(files) == 3
+    assert all((out / name).exists() for name in files)
+
+
+def test_row_stem_is_stable():
+    assert row_stem(7, {"id": "x/y"}) == "x_y-000007"
+    assert row_stem(7, {}) == "row-000007"
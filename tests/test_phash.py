@@ -0,0 +1,42 @@
+import hashlib
+import threading
+
+from utils.phash import HashIndex
+
+
+def digest(label: str) -> str:
+    return hashlib.sha256(label.encode()).hexdigest()
+
+
+def test_concurrent_adds_of_one_key_store_it_once(tmp_path):
+    index = HashIndex(str(tmp_path))
+    start = threading.Barrier(8)
+
+    def add():
+        start.wait()
+        for _ in range(50):
+            index.add(0x0123456789ABCDEF, digest("a"))
+
+    threads = [threading.Thread(target=add) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(index) == 1
+    assert len(HashIndex(str(tmp_path))) == 1
+
+
+def test_retain_drops_entries_and_rewrites_files(tmp_path):
+    index = HashIndex(str(tmp_path), merge_threshold=2)
+    for i, label in enumerate("abc"):
+        index.add(i << 8, digest(label))
+
+    assert index.retain(lambda key: key != digest("b")) == 1
+    assert index.query(1 << 8, 0) == []
+    assert index.query(2 << 8, 0) == [(digest("c"), 0)]
+
+    reopened = HashIndex(str(tmp_path))
+    assert len(reopened) == 2
+    assert reopened.nearest(0, 0) == (digest("a"), 0)
+    assert reopened.retain(lambda key: True) == 0
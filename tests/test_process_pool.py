@@ -0,0 +1,78 @@
+import io
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+from utils.process_pool import PoolBusy, ProcessImagePool
+
+
+def make_pool(**overrides) -> ProcessImagePool:
+    options = dict(workers=1, max_pending=4, max_tasks_per_child=50, min_pixels=1, submit_timeout=5.0)
+    options.update(overrides)
+    return ProcessImagePool(**options)
+
+
+@pytest.fixture
+def pool():
+    pool = make_pool()
+    yield pool
+    if pool._executor is not None:
+        pool._executor.shutdown(wait=True)
+
+
+def gradient(mode: str, size=(64, 48)) -> Image.Image:
+    image = Image.linear_gradient('L').resize(size)
+    return image if mode == 'L' else image.convert(mode)
+
+
+def test_offloaded_results_match_inline(pool):
+    inline = make_pool(workers=0)
+    image = gradient('RGB')
+    assert pool.offloads(image)
+
+    assert pool.resize(image, (32, 24)).tobytes() == inline.resize(image, (32, 24)).tobytes()
+    assert pool.convert(image, 'L').tobytes() == inline.convert(image, 'L').tobytes()
+    decoded = Image.open(io.BytesIO(pool.encode(image, 'PNG')))
+    assert decoded.mode == 'RGB' and decoded.tobytes() == image.tobytes()
+    assert pool.stats()['offloaded'] == 3
+
+
+@pytest.mark.parametrize("mode", ['P', 'I;16', 'LA'])
+def test_other_modes_run_inline_and_keep_their_mode(pool, mode):
+    image = gradient(mode)
+    assert not pool.offloads(image)
+    decoded = Image.open(io.BytesIO(pool.encode(image, 'PNG')))
+    assert decoded.mode == mode
+    assert pool.resize(image, (32, 24)).mode == mode
+    assert pool.stats()['offloaded'] == 0
+
+
+def test_offloaded_encode_keeps_icc_profile(pool):
+    image = gradient('RGB')
+    image.info['icc_profile'] = b'fake-profile'
+    decoded = Image.open(io.BytesIO(pool.encode(image, 'PNG')))
+    assert decoded.info.get('icc_profile') == b'fake-profile'
+
+
+def test_full_queue_raises_pool_busy():
+    pool = make_pool(max_pending=1, submit_timeout=0.05)
+    try:
+        slow = pool._submit(time.sleep, (0.5,), [], lambda _: None)
+        with pytest.raises(PoolBusy):
+            pool._submit(time.sleep, (0,), [], lambda _: None)
+        slow.result()
+        # The slot is released once the running task finishes
+        pool._submit(time.sleep, (0,), [], lambda _: None).result()
+        assert pool.stats()['busy'] == 1
+    finally:
+        pool._executor.shutdown(wait=True)
+
+
+def test_crashed_pool_is_rebuilt(pool):
+    with pytest.raises(BrokenProcessPool):
+        pool._submit(os._exit, (1,), [], lambda _: None).result()
+    assert pool.resize(gradient('RGB'), (16, 12)).size == (16, 12)
+    assert pool.stats()['restarts'] == 1
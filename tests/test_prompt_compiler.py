@@ -0,0 +1,27 @@
+from utils.prompt_compiler import _FRAGMENTS, _QUALITY_FRAGMENTS, compile_prompt
+
+SELECTIONS = {'style': "Digital Art", 'aspect_ratio': "Portrait (3:4)"}
+
+
+def test_long_base_prompt_keeps_selected_presets():
+    base = " ".join(["a quiet harbour at dawn"] * 30)
+    compiled = compile_prompt(base, SELECTIONS, token_budget=120)
+    assert compiled.text.startswith(base)
+    for phrase in _FRAGMENTS['style']["Digital Art"] + _FRAGMENTS['aspect_ratio']["Portrait (3:4)"]:
+        assert phrase in compiled.fragments
+    # Nothing is dropped for budget; only phrases repeated by a kept one go
+    kept_words = " ".join(compiled.fragments).split()
+    assert all(set(phrase.split()) <= set(kept_words) for phrase in compiled.dropped)
+
+
+def test_budget_trims_lowest_priority_fragments_first():
+    compiled = compile_prompt("a cat", SELECTIONS, token_budget=10)
+    assert compiled.fragments[0] == _FRAGMENTS['style']["Digital Art"][0]
+    assert set(_QUALITY_FRAGMENTS) <= set(compiled.dropped)
+    assert compiled.text.startswith("a cat, ")
+
+
+def test_selection_order_does_not_change_the_prompt():
+    forward = compile_prompt("a cat", SELECTIONS)
+    backward = compile_prompt("a cat", dict(reversed(list(SELECTIONS.items()))))
+    assert forward.text == backward.text and forward.key == backward.key
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from utils.providers import ProviderRouter, StubProvider
+from utils.resilience import BackendError, CircuitBreaker, ResilientBackend, RetryPolicy
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 16
+
+
+def stub(name: str, error_rate: float, recovery_seconds: float) -> StubProvider:
+    """Stub behind its own breaker that trips on the first failure and never retries"""
+    backend = ResilientBackend(name, RetryPolicy(1, 0.0, 0.0), CircuitBreaker(1, recovery_seconds))
+    return StubProvider(name, PNG, error_rate=error_rate, backend=backend)
+
+
+def test_router_skips_tripped_provider_until_recovery():
+    provider = stub("stub-recovery", error_rate=1.0, recovery_seconds=0.05)
+    router = ProviderRouter([provider])
+
+    with pytest.raises(BackendError, match="stub failure"):
+        router.generate("a red mug")
+    assert provider.backend.breaker.state == CircuitBreaker.OPEN
+    assert router.ranked() == []
+    with pytest.raises(BackendError, match="No image provider"):
+        router.generate("a red mug")
+
+    time.sleep(0.06)
+    provider.error_rate = 0.0
+    assert router.ranked() == [provider]
+    result = router.generate("a red mug")
+    assert result.provider == "stub-recovery"
+    assert provider.backend.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_router_fails_over_while_breaker_is_open():
+    failing = stub("stub-failing", error_rate=1.0, recovery_seconds=60.0)
+    healthy = stub("stub-healthy", error_rate=0.0, recovery_seconds=60.0)
+    router = ProviderRouter([failing, healthy])
+
+    assert router.generate("a blue mug").provider == "stub-healthy"
+    assert failing.backend.breaker.state == CircuitBreaker.OPEN
+    assert router.ranked() == [healthy]
+    assert router.generate("a blue mug").provider == "stub-healthy"
+
+
+def test_would_allow_does_not_claim_the_probe():
+    breaker = CircuitBreaker(1, 0.0)
+    breaker.record_failure()
+    assert breaker.would_allow()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow()
+    assert not breaker.would_allow()
@@ -0,0 +1,109 @@
+import time
+import threading
+
+import pytest
+
+from utils.progress import GenerationCancelled, GenerationProgress
+from utils.rate_limiter import FairQueue, RateLimitTimeout
+
+
+class ManualBucket:
+    """Token bucket stand-in that only hands out tokens the test releases"""
+
+    rate = 1.0
+    capacity = 1.0
+
+    def __init__(self, tokens: int = 0):
+        self.tokens = tokens
+        self._lock = threading.Lock()
+
+    def release(self, tokens: int = 1):
+        with self._lock:
+            self.tokens += tokens
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        with self._lock:
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return 0.01
+
+    def pause(self, seconds: float):
+        pass
+
+
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def start_waiter(queue: FairQueue, session: str, label: str, granted: list, errors: list, **kwargs):
+    def run():
+        try:
+            queue.acquire(session, **kwargs)
+            granted.append(label)
+        except BaseException as e:
+            errors.append((label, e))
+
+    depth = queue.stats()['waiting']
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    wait_for(lambda: queue.stats()['waiting'] == depth + 1 or errors)
+    return thread
+
+
+def test_sessions_take_turns_in_finish_time_order():
+    bucket = ManualBucket()
+    queue = FairQueue(bucket)
+    granted, errors = [], []
+    threads = [start_waiter(queue, "a", f"a{i}", granted, errors) for i in range(3)]
+    threads.append(start_waiter(queue, "b", "b0", granted, errors))
+
+    for count in range(1, 5):
+        bucket.release()
+        wait_for(lambda: len(granted) == count)
+    for thread in threads:
+        thread.join(1.0)
+
+    assert errors == []
+    # b's one request finishes with a's first, not after all of a's
+    assert granted == ["a0", "b0", "a1", "a2"]
+    assert queue._last_finish == {}
+
+
+def test_timeout_leaves_the_queue_and_forgets_the_session():
+    queue = FairQueue(ManualBucket())
+    with pytest.raises(RateLimitTimeout):
+        queue.acquire("a", timeout=0.05)
+
+    assert queue.stats()['waiting'] == 0
+    assert queue.stats()['timeouts'] == 1
+    assert queue._last_finish == {}
+
+
+def test_cancelled_waiter_lets_the_next_session_through():
+    bucket = ManualBucket()
+    queue = FairQueue(bucket)
+    granted, errors = [], []
+    progress = GenerationProgress()
+    first = start_waiter(queue, "a", "a0", granted, errors, progress=progress)
+    second = start_waiter(queue, "b", "b0", granted, errors)
+
+    progress.cancel()
+    first.join(2.0)
+    assert [label for label, _ in errors] == ["a0"]
+    assert isinstance(errors[0][1], GenerationCancelled)
+
+    bucket.release()
+    second.join(2.0)
+    assert granted == ["b0"]
+    assert queue._last_finish == {}
+
+
+def test_finish_times_of_idle_sessions_are_dropped():
+    queue = FairQueue(ManualBucket(tokens=1000))
+    for i in range(500):
+        queue.acquire(f"session-{i}")
+    assert len(queue._last_finish) <= 1
@@ -0,0 +1,46 @@
+import time
+import threading
+
+from utils.instrumentation import current_session
+from utils.progress import GenerationCancelled, GenerationProgress
+from utils.resilience import CircuitBreaker, ResilientBackend, RetryPolicy
+
+
+def hedged_backend(name: str) -> ResilientBackend:
+    return ResilientBackend(name, RetryPolicy(1, 0.0, 0.0), CircuitBreaker(5, 60.0), hedge_after=0.02)
+
+
+def test_hedged_attempts_keep_session_and_cancel_the_loser():
+    backend = hedged_backend("hedge-test")
+    sessions = []
+    loser_cancelled = threading.Event()
+    calls = []
+
+    def stream(progress: GenerationProgress) -> str:
+        sessions.append(current_session.get())
+        attempt = len(calls)
+        calls.append(progress)
+        if attempt == 0:
+            # Slow primary: keeps "streaming" until it is told to stop
+            try:
+                while True:
+                    progress.check_cancelled()
+                    progress.add_text("primary ")
+                    time.sleep(0.005)
+            except GenerationCancelled:
+                loser_cancelled.set()
+                raise
+        progress.add_text("hedge")
+        return "hedge"
+
+    caller_progress = GenerationProgress()
+    current_session.set("session-A")
+    assert backend.call(stream, caller_progress) == "hedge"
+
+    assert sessions == ["session-A", "session-A"]
+    assert loser_cancelled.wait(1.0)
+    assert not caller_progress.cancelled
+    assert calls[0] is not caller_progress and calls[1] is not calls[0]
+    # Only the primary publishes to the caller's progress
+    assert "hedge" not in caller_progress.text
+    assert backend.stats()['hedge_wins'] == 1
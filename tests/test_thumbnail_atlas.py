@@ -0,0 +1,46 @@
+import hashlib
+import multiprocessing
+
+from PIL import Image
+
+from utils.thumbnail_atlas import ThumbnailAtlas
+
+
+def digest(label: str) -> str:
+    return hashlib.sha256(label.encode()).hexdigest()
+
+
+def solid(color) -> Image.Image:
+    return Image.new('RGB', (8, 8), color)
+
+
+def put_from_other_process(root: str, label: str, color):
+    ThumbnailAtlas(root, (8, 8), 2).put(digest(label), solid(color))
+
+
+def test_instances_share_the_cursor(tmp_path):
+    first = ThumbnailAtlas(str(tmp_path), (8, 8), 2)
+    second = ThumbnailAtlas(str(tmp_path), (8, 8), 2)
+    first.put(digest("a"), solid('red'))
+    second.put(digest("b"), solid('green'))
+
+    # b took the next slot instead of overwriting a
+    assert first.get(digest("a")).getpixel((0, 0)) == (255, 0, 0)
+    assert second.get(digest("b")).getpixel((0, 0)) == (0, 128, 0)
+
+
+def test_slot_reused_by_another_process_reads_as_miss(tmp_path):
+    atlas = ThumbnailAtlas(str(tmp_path), (8, 8), 2)
+    atlas.put(digest("a"), solid('red'))
+    atlas.put(digest("b"), solid('green'))
+
+    context = multiprocessing.get_context("spawn")
+    process = context.Process(target=put_from_other_process, args=(str(tmp_path), "c", (0, 0, 255)))
+    process.start()
+    process.join(timeout=60)
+    assert process.exitcode == 0
+
+    # c overwrote a's slot; a must not come back with c's pixels
+    assert atlas.get(digest("a")) is None
+    assert digest("a") not in atlas
+    assert atlas.get(digest("b")).getpixel((0, 0)) == (0, 128, 0)
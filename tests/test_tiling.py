@@ -0,0 +1,36 @@
+import io
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from utils.tiling import TiledProcessor, load_as_memmap, scratch, sweep_scratch
+
+
+def png_bytes(size=(300, 200)) -> bytes:
+    buffer = io.BytesIO()
+    Image.linear_gradient('L').resize(size).convert('RGB').save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_scratch_removes_files_on_exit(tmp_path):
+    processor = TiledProcessor(tile_size=128, overlap=16, workers=2, scratch_dir=str(tmp_path))
+    with scratch(load_as_memmap(png_bytes(), str(tmp_path))) as pixels:
+        with scratch(processor.process(pixels, lambda tile: tile)) as result:
+            assert np.array_equal(np.asarray(result), np.asarray(pixels))
+    assert list(tmp_path.glob("*.raw")) == []
+
+
+def test_sweep_removes_only_stale_files(tmp_path):
+    stale = tmp_path / "stale.raw"
+    fresh = tmp_path / "fresh.raw"
+    other = tmp_path / "other.txt"
+    for path in (stale, fresh, other):
+        path.write_bytes(b"x")
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+    os.utime(other, (old, old))
+
+    assert sweep_scratch(str(tmp_path), max_age=60) == 1
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["fresh.raw", "other.txt"]
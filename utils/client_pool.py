@@ -0,0 +1,133 @@
+import time
+import hashlib
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from config.settings import Settings
+from utils.startup import lazy_import
+
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
+
+
+class _PooledClient:
+    """A shared genai.Client plus usage bookkeeping"""
+
+    def __init__(self, client: "genai.Client"):
+        self.client = client
+        self.created_at = time.time()
+        self.last_used_at = self.created_at
+        self.uses = 0
+
+
+class ClientRegistry:
+    """Process-wide genai.Client instances keyed by API key
+
+    Each client owns one HTTP connection pool, so reusing it across sessions
+    keeps TLS connections alive instead of handshaking per session.
+    """
+
+    def __init__(self, max_connections: int, max_keepalive: int, keepalive_expiry: float,
+                 base_url: Optional[str] = None):
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self._clients: Dict[str, _PooledClient] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key_id(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+    def _http_options(self) -> "Optional[types.HttpOptions]":
+        types = lazy_import("google.genai.types")
+        options = {}
+        if self.base_url:
+            # e.g. the local fake server used by the benchmarks
+            options['base_url'] = self.base_url
+        try:
+            import httpx
+            return types.HttpOptions(client_args={
+                'limits': httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=self.keepalive_expiry,
+                )
+            }, **options)
+        except (ImportError, TypeError, ValueError):
+            # Older SDKs without client_args fall back to their default pool
+            return types.HttpOptions(**options) if options else None
+
+    def _create(self, api_key: str) -> "genai.Client":
+        genai = lazy_import("google.genai")
+        http_options = self._http_options()
+        if http_options is not None:
+            return genai.Client(api_key=api_key, http_options=http_options)
+        return genai.Client(api_key=api_key)
+
+    def get(self, api_key: str) -> "genai.Client":
+        """Return the shared client for api_key, creating it on first use"""
+        key_id = self._key_id(api_key)
+        with self._lock:
+            pooled = self._clients.get(key_id)
+            if pooled is None:
+                self.misses += 1
+                pooled = _PooledClient(self._create(api_key))
+                self._clients[key_id] = pooled
+            else:
+                self.hits += 1
+            pooled.uses += 1
+            pooled.last_used_at = time.time()
+            return pooled.client
+
+    def discard(self, api_key: str):
+        """Drop the client for api_key, e.g. after the key was rotated"""
+        with self._lock:
+            self._clients.pop(self._key_id(api_key), None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool statistics for capacity planning"""
+        with self._lock:
+            clients: List[Dict[str, Any]] = [
+                {
+                    'key': key_id[:8],
+                    'uses': pooled.uses,
+                    'age_seconds': round(time.time() - pooled.created_at),
+                    'idle_seconds': round(time.time() - pooled.last_used_at),
+                }
+                for key_id, pooled in self._clients.items()
+            ]
+            return {
+                'clients': len(self._clients),
+                'hits': self.hits,
+                'misses': self.misses,
+                'max_connections_per_client': self.max_connections,
+                'max_keepalive_per_client': self.max_keepalive,
+                'details': clients,
+            }
+
+
+_registry: Optional[ClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> ClientRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ClientRegistry(
+                Settings.HTTP_MAX_CONNECTIONS,
+                Settings.HTTP_MAX_KEEPALIVE,
+                Settings.HTTP_KEEPALIVE_EXPIRY,
+                Settings.GEMINI_BASE_URL,
+            )
+        return _registry
+
+
+def get_genai_client(api_key: str) -> "genai.Client":
+    """Shared genai.Client for api_key"""
+    return get_client_registry().get(api_key)
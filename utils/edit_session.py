@@ -0,0 +1,179 @@
+import time
+import json
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from config.settings import Settings
+from utils.generated_image import GeneratedImage
+from utils.progress import GenerationProgress
+from utils.prompt_compiler import estimate_tokens
+from utils.utils import normalize_prompt
+
+if TYPE_CHECKING:
+    from utils.gemini_client import GeminiClient
+
+
+class EditTurnExpired(LookupError):
+    """Raised when a turn's result has been evicted from the generation cache"""
+
+
+@dataclass
+class EditTurn:
+    """One node of the edit tree; turn 0 is the uploaded source image"""
+    turn_id: int
+    parent_id: Optional[int]
+    instruction: str
+    cache_key: str
+    mime_type: str
+    text: Optional[str] = None
+    # Files API handle of this turn's image, uploaded only once a later turn builds on it
+    file: Any = field(default=None, repr=False)
+    uploaded_at: float = 0.0
+
+
+class EditSession:
+    """Multi-turn conversational editing with constant per-turn payloads
+
+    Images go to the Files API once and are referenced by handle afterwards;
+    each request carries only the image being edited, the new instruction and
+    a trimmed text window of earlier turns. Results are stored per turn in the
+    generation cache, so undo, checkout and repeating an instruction from the
+    same point never call the model again.
+    """
+
+    def __init__(self, client: "GeminiClient", source: GeneratedImage):
+        self.client = client
+        self.cache = client.cache
+        self.source = source
+        root = EditTurn(0, None, "", hashlib.sha256(source.data).hexdigest(), source.mime_type)
+        self.turns: Dict[int, EditTurn] = {0: root}
+        self.head = 0
+        self._children: Dict[Tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.model_calls = 0
+
+    def image(self, turn_id: Optional[int] = None) -> GeneratedImage:
+        """The image as of turn_id (default: the current head)"""
+        turn = self.turns[self.head if turn_id is None else turn_id]
+        if turn.turn_id == 0:
+            return self.source
+        data = self.cache.get(turn.cache_key)
+        if data is None:
+            raise EditTurnExpired(f"The result of edit {turn.turn_id} is no longer cached")
+        return GeneratedImage(data, turn.mime_type, text=turn.text)
+
+    def lineage(self, turn_id: Optional[int] = None) -> List[EditTurn]:
+        """Turns from the source up to turn_id, oldest first"""
+        turn = self.turns[self.head if turn_id is None else turn_id]
+        path = [turn]
+        while turn.parent_id is not None:
+            turn = self.turns[turn.parent_id]
+            path.append(turn)
+        return path[::-1]
+
+    def children(self, turn_id: int) -> List[EditTurn]:
+        return [turn for turn in self.turns.values() if turn.parent_id == turn_id]
+
+    def history_window(self, turn_id: int) -> List[EditTurn]:
+        """Most recent turns up to turn_id that fit the conversation length and token budget"""
+        window: List[EditTurn] = []
+        tokens = 0
+        for turn in reversed(self.lineage(turn_id)[1:]):
+            cost = estimate_tokens(turn.instruction) + estimate_tokens(turn.text or "")
+            if len(window) >= Settings.MAX_CONVERSATION_LENGTH or tokens + cost > Settings.EDIT_HISTORY_TOKEN_BUDGET:
+                break
+            window.append(turn)
+            tokens += cost
+        return window[::-1]
+
+    def _file_handle(self, turn: EditTurn):
+        """Uploaded handle for turn's image, re-uploading once the Files API copy expires"""
+        if turn.file is None or time.time() - turn.uploaded_at > Settings.EDIT_FILE_TTL_SECONDS:
+            turn.file = self.client.upload_image(self.image(turn.turn_id))
+            turn.uploaded_at = time.time()
+            self.uploads += 1
+        return turn.file
+
+    def _contents(self, parent: EditTurn, window: List[EditTurn], instruction: str):
+        types = self.client.types
+        contents = []
+        for turn in window:
+            contents.append(types.Content(role='user', parts=[types.Part.from_text(text=turn.instruction)]))
+            contents.append(types.Content(role='model', parts=[types.Part.from_text(text=turn.text or "Done.")]))
+        handle = self._file_handle(parent)
+        contents.append(types.Content(role='user', parts=[
+            types.Part.from_uri(file_uri=handle.uri, mime_type=handle.mime_type),
+            types.Part.from_text(text=instruction),
+        ]))
+        return contents
+
+    def _turn_key(self, parent: EditTurn, window: List[EditTurn], instruction: str) -> str:
+        payload = json.dumps({
+            'model': self.client.model_id,
+            'parent': parent.cache_key,
+            'history': [[turn.instruction, turn.text] for turn in window],
+            'instruction': instruction,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def edit(self, instruction: str, parent_id: Optional[int] = None,
+             progress: Optional[GenerationProgress] = None) -> Optional[EditTurn]:
+        """Apply instruction to parent_id's image (default: head) and move head to the result
+
+        Editing from an earlier turn starts a new branch. Returns None if the
+        model answered without an image; errors propagate to the caller.
+        """
+        instruction = normalize_prompt(instruction)
+        with self._lock:
+            parent = self.turns[self.head if parent_id is None else parent_id]
+            existing = self._children.get((parent.turn_id, instruction))
+        if existing is not None and self.cache.get(self.turns[existing].cache_key) is not None:
+            with self._lock:
+                self.head = existing
+            return self.turns[existing]
+
+        window = self.history_window(parent.turn_id)
+        key = self._turn_key(parent, window, instruction)
+        data = self.cache.get(key)
+        if data is not None:
+            result = GeneratedImage(data)
+        else:
+            if progress is not None:
+                progress.check_cancelled()
+            result = self.client.edit_image_or_raise(self._contents(parent, window, instruction))
+            self.model_calls += 1
+            if result is None:
+                return None
+            self.cache.put(key, result.data)
+
+        with self._lock:
+            turn = EditTurn(len(self.turns), parent.turn_id, instruction, key, result.mime_type, result.text)
+            self.turns[turn.turn_id] = turn
+            self._children[(parent.turn_id, instruction)] = turn.turn_id
+            self.head = turn.turn_id
+        return turn
+
+    def undo(self) -> EditTurn:
+        """Step head back to its parent; the undone turn stays available for checkout"""
+        with self._lock:
+            parent_id = self.turns[self.head].parent_id
+            if parent_id is not None:
+                self.head = parent_id
+            return self.turns[self.head]
+
+    def checkout(self, turn_id: int) -> EditTurn:
+        """Move head to any earlier turn; the next edit branches from there"""
+        with self._lock:
+            self.head = self.turns[turn_id].turn_id
+            return self.turns[self.head]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'turns': len(self.turns) - 1,
+            'head': self.head,
+            'uploads': self.uploads,
+            'model_calls': self.model_calls,
+        }
@@ -0,0 +1,180 @@
+import hashlib
+import contextvars
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+from PIL import Image, features
+
+from config.settings import Settings
+from utils.generated_image import GeneratedImage
+from utils.process_pool import get_process_pool
+
+# Pillow format and mime type per file extension accepted in Settings.SUPPORTED_FORMATS
+FORMAT_SPECS: Dict[str, Tuple[str, str]] = {
+    'jpg': ('JPEG', 'image/jpeg'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+    'avif': ('AVIF', 'image/avif'),
+}
+
+Source = Union[Image.Image, GeneratedImage]
+
+
+def can_encode(fmt: str) -> bool:
+    """Whether this Pillow build can write the given extension's format"""
+    spec = FORMAT_SPECS.get(fmt.lower())
+    if spec is None:
+        return False
+    if spec[0] == 'AVIF':
+        try:
+            # Native AVIF needs Pillow >= 11.2 built against libavif
+            if not features.check_module('avif'):
+                return False
+        except ValueError:
+            return False
+    Image.init()
+    return spec[0] in Image.SAVE
+
+
+def offered_formats() -> List[str]:
+    """Download formats from Settings.SUPPORTED_FORMATS that can be written, one per codec"""
+    offered, seen = [], set()
+    for fmt in Settings.SUPPORTED_FORMATS:
+        spec = FORMAT_SPECS.get(fmt.lower())
+        if spec is None or spec[0] in seen or not can_encode(fmt):
+            continue
+        seen.add(spec[0])
+        offered.append(fmt.lower())
+    return offered
+
+
+def _save_params(pil_format: str, quality: Optional[int]) -> Dict:
+    if pil_format == 'PNG':
+        # Lossless either way; a lower level trades a little size for much faster encodes
+        return {'compress_level': 3 if quality is None or quality < 95 else 6}
+    if quality is None:
+        quality = Settings.ENCODE_QUALITY['standard']
+    if pil_format == 'WEBP':
+        return {'quality': quality, 'method': 4}
+    if pil_format == 'AVIF':
+        return {'quality': quality, 'speed': 8}
+    return {'quality': quality}
+
+
+class ImageEncoder:
+    """Format/quality-tiered encoding on a thread pool with a per-image variant cache
+
+    Variants are keyed by a digest of the source plus format, tier and size, so
+    reruns that display or offer the same image never re-encode it. Sources
+    that are already in the requested format pass through untouched.
+    """
+
+    def __init__(self, workers: int, cache_bytes: int):
+        self.cache_bytes = cache_bytes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="encode")
+        self._cache: "OrderedDict[Tuple, GeneratedImage]" = OrderedDict()
+        self._cache_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(source: Source) -> str:
+        if isinstance(source, GeneratedImage):
+            payload = source.data
+        else:
+            payload = source.mode.encode() + repr(source.size).encode() + source.tobytes()
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    def _cache_get(self, key: Tuple) -> Optional[GeneratedImage]:
+        with self._lock:
+            encoded = self._cache.get(key)
+            if encoded is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return encoded
+
+    def _cache_put(self, key: Tuple, encoded: GeneratedImage):
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = encoded
+            self._cache_size += encoded.nbytes
+            while self._cache_size > self.cache_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_size -= evicted.nbytes
+
+    def _encode(self, source: Source, fmt: str, tier: str,
+                max_size: Optional[Tuple[int, int]]) -> GeneratedImage:
+        pil_format, mime_type = FORMAT_SPECS[fmt]
+        image = source.image if isinstance(source, GeneratedImage) else source
+        pool = get_process_pool()
+        if max_size is not None:
+            image = pool.thumbnail(image, max_size)
+        if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = pool.convert(image, 'RGB')
+        # Large frames are encoded in a worker process; small ones stay on this thread
+        data = pool.encode(image, pil_format, **_save_params(pil_format, Settings.ENCODE_QUALITY.get(tier)))
+        return GeneratedImage(data, mime_type)
+
+    def encode(self, source: Source, fmt: str, tier: str = 'standard',
+               max_size: Optional[Tuple[int, int]] = None) -> GeneratedImage:
+        """Encode source as fmt (an extension from FORMAT_SPECS) at a quality tier"""
+        return self.encode_async(source, fmt, tier, max_size).result()
+
+    def encode_async(self, source: Source, fmt: str, tier: str = 'standard',
+                     max_size: Optional[Tuple[int, int]] = None) -> "Future[GeneratedImage]":
+        """Like encode(), but returns a Future so several variants can encode in parallel"""
+        fmt = fmt.lower()
+        if fmt not in FORMAT_SPECS:
+            raise ValueError(f"Unsupported output format: {fmt}")
+        future: "Future[GeneratedImage]" = Future()
+
+        if (isinstance(source, GeneratedImage) and max_size is None
+                and source.mime_type == FORMAT_SPECS[fmt][1]):
+            future.set_result(source)
+            return future
+
+        key = (self._digest(source), fmt, tier, max_size)
+        encoded = self._cache_get(key)
+        if encoded is not None:
+            future.set_result(encoded)
+            return future
+
+        def run() -> GeneratedImage:
+            result = self._encode(source, fmt, tier, max_size)
+            self._cache_put(key, result)
+            return result
+
+        # Keep span attribution to the calling session
+        return self._executor.submit(contextvars.copy_context().run, run)
+
+    def preview(self, source: Source) -> GeneratedImage:
+        """Small, fast-to-send variant for on-screen display"""
+        return self.encode(source, Settings.PREVIEW_FORMAT, 'preview', Settings.PREVIEW_MAX_SIZE)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._cache),
+                'bytes': self._cache_size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+_encoder: Optional[ImageEncoder] = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder() -> ImageEncoder:
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = ImageEncoder(Settings.ENCODE_WORKERS, Settings.ENCODE_CACHE_BYTES)
+        return _encoder
@@ -1,50 +1,279 @@
-from google import genai
-from google.genai import types
 import streamlit as st
-from typing import Optional
-import PIL.Image
+from PIL import Image
+from typing import Optional, Iterable, Iterator, Union
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+import contextvars
+import hashlib
+import json
+import io
+
+from config.settings import Settings
+from utils.client_pool import get_genai_client
+from utils.edit_session import EditSession
+from utils.encoding import get_encoder
+from utils.generated_image import GeneratedImage
+from utils.generation_cache import GenerationCache, get_generation_cache
+from utils.instrumentation import span
+from utils.progress import GenerationCancelled, GenerationProgress
+from utils.rate_limiter import get_rate_limiter
+from utils.startup import lazy_import
+from utils.resilience import classify_error, get_resilient_backend
+from utils.single_flight import get_single_flight
+from utils.utils import normalize_prompt
+
+@dataclass
+class BatchItem:
+    """Outcome of one prompt/variation in a batch; exactly one of image or error is set"""
+    index: int
+    variation: int
+    prompt: str
+    image: Optional[GeneratedImage] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.image is not None
 
 class GeminiClient:
     """Fixed Gemini client based on working code pattern"""
     
-    def __init__(self, api_key: str):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(self, api_key: str, cache: Optional[GenerationCache] = None):
+        # The SDK is only loaded once a session actually connects
+        types = lazy_import("google.genai.types")
+        self.types = types
+        self.client = get_genai_client(api_key)
         self.model_id = "gemini-2.5-flash-image-preview"
+        self.safety_settings = [
+            types.SafetySetting(
+                category=types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+                threshold=types.HarmBlockThreshold.BLOCK_NONE,
+            )
+        ]
+        self.response_modalities = ['Text', 'Image']
+        self.cache = cache if cache is not None else get_generation_cache()
+        self.rate_limiter = get_rate_limiter(api_key)
+        self.backend = get_resilient_backend("gemini")
+        self.single_flight = get_single_flight()
     
-    def generate_image(self, prompt: str) -> Optional[PIL.Image.Image]:
-        """Generate image using correct API method"""
+    def cache_key(self, prompt: str) -> str:
+        """Hash of everything that determines the generated output"""
+        payload = json.dumps({
+            'model': self.model_id,
+            'prompt': normalize_prompt(prompt),
+            'safety': [[str(s.category), str(s.threshold)] for s in self.safety_settings],
+            'modalities': self.response_modalities,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def _generation_config(self):
+        return self.types.GenerateContentConfig(
+            safety_settings=self.safety_settings,
+            response_modalities=self.response_modalities
+        )
+    
+    def _backoff_on_quota(self, exc: Exception):
+        """On 429, hold back every session sharing this key instead of letting each hit the limit"""
+        error = classify_error(exc)
+        if error.status == 429:
+            self.rate_limiter.pause(error.retry_after or 60.0 / Settings.GEMINI_REQUESTS_PER_MINUTE)
+    
+    def _request_image(self, prompt: str) -> Optional[GeneratedImage]:
+        """Call the model and return the first image part, keeping its original encoding"""
+        return self._request_contents(normalize_prompt(prompt))
+    
+    def _request_contents(self, contents) -> Optional[GeneratedImage]:
+        """generate_content for a prompt or a list of Content turns; first image part wins"""
+        self.rate_limiter.acquire()
+        
+        # Use generate_content, not generate_image
         try:
-            # Use generate_content, not generate_image
             response = self.client.models.generate_content(
                 model=self.model_id,
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    safety_settings=[
-                        types.SafetySetting(
-                            category=types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                            threshold=types.HarmBlockThreshold.BLOCK_NONE,
-                        )
-                    ],
-                    response_modalities=['Text', 'Image']
+                contents=contents,
+                config=self._generation_config()
+            )
+        except Exception as e:
+            self._backoff_on_quota(e)
+            raise
+        
+        # Extract image from response parts without decoding it
+        texts = []
+        for part in response.parts or []:
+            if part.text:
+                texts.append(part.text)
+            elif part.inline_data is not None and part.inline_data.data:
+                return GeneratedImage(
+                    part.inline_data.data,
+                    part.inline_data.mime_type,
+                    text="\n".join(texts) or None
                 )
+        
+        return None
+    
+    def _stream_image(self, prompt: str, progress: GenerationProgress) -> Optional[GeneratedImage]:
+        """Stream the response, publishing text and image parts to progress as they arrive"""
+        self.rate_limiter.acquire(progress=progress)
+        progress.check_cancelled()
+        
+        stream = self.client.models.generate_content_stream(
+            model=self.model_id,
+            contents=normalize_prompt(prompt),
+            config=self._generation_config()
+        )
+        
+        result = None
+        texts = []
+        try:
+            for chunk in stream:
+                # Stop reading as soon as the user gives up; closing the stream ends the request
+                progress.check_cancelled()
+                for part in chunk.parts or []:
+                    if part.text:
+                        texts.append(part.text)
+                        progress.add_text(part.text)
+                    elif part.inline_data is not None and part.inline_data.data:
+                        # Later image parts supersede earlier (preview) ones
+                        result = GeneratedImage(part.inline_data.data, part.inline_data.mime_type)
+                        progress.set_preview(result)
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            self._backoff_on_quota(e)
+            raise
+        finally:
+            close = getattr(stream, 'close', None)
+            if close is not None:
+                close()
+        
+        if result is not None:
+            result.text = "".join(texts) or None
+        return result
+    
+    def generate_image_or_raise(
+        self,
+        prompt: str,
+        progress: Optional[GenerationProgress] = None
+    ) -> Optional[GeneratedImage]:
+        """Generate image, served from the cache when possible; errors propagate to the caller
+        
+        With a progress object the response is streamed so partial output shows
+        up early and the request can be cancelled mid-flight.
+        """
+        with span("prompt_build"):
+            key = self.cache_key(prompt)
+        with span("cache_lookup"):
+            data = self.cache.get(key)
+        if data is not None:
+            return GeneratedImage(data, provider="cache")
+        
+        # Identical requests already in flight (from any session) share one API call
+        return self.single_flight.do(key, self._fetch_and_store, key, prompt, progress, progress=progress)
+    
+    def _fetch_and_store(
+        self,
+        key: str,
+        prompt: str,
+        progress: Optional[GenerationProgress]
+    ) -> Optional[GeneratedImage]:
+        with span("network.gemini"):
+            if progress is not None and hasattr(self.client.models, 'generate_content_stream'):
+                result = self.backend.call(self._stream_image, prompt, progress)
+            else:
+                result = self.backend.call(self._request_image, prompt)
+        if result is not None:
+            self.cache.put(key, result.data)
+        return result
+    
+    def upload_image(self, image: GeneratedImage):
+        """Upload image bytes once via the Files API; returns the file handle to refer to"""
+        with span("network.gemini_upload"):
+            return self.client.files.upload(
+                file=io.BytesIO(image.data),
+                config=self.types.UploadFileConfig(mime_type=image.mime_type)
             )
-            
-            # Extract image from response parts
-            for part in response.parts:
-                if hasattr(part, 'as_image') and part.as_image():
-                    return part.as_image()
-            
-            return None
-            
+    
+    def edit_image_or_raise(self, contents) -> Optional[GeneratedImage]:
+        """One conversational edit turn; contents already reference images by handle"""
+        with span("network.gemini"):
+            return self.backend.call(self._request_contents, contents)
+    
+    def start_edit_session(self, source: Union[Image.Image, GeneratedImage, bytes]) -> EditSession:
+        """Multi-turn editing of source; see EditSession"""
+        if isinstance(source, bytes):
+            source = GeneratedImage(source)
+        elif isinstance(source, Image.Image):
+            source = get_encoder().encode(source, 'png')
+        return EditSession(self, source)
+    
+    def generate_image(self, prompt: str) -> Optional[GeneratedImage]:
+        """Generate image using correct API method"""
+        try:
+            return self.generate_image_or_raise(prompt)
+        
         except Exception as e:
             st.error(f"Generation error: {str(e)}")
             return None
     
+    @staticmethod
+    def variation_prompt(prompt: str, variation: int) -> str:
+        """Distinct prompt per variation so each gets its own cache entry and output"""
+        if variation == 0:
+            return prompt
+        return f"{prompt}, alternative variation {variation + 1}"
+    
+    def generate_batch(
+        self,
+        prompts: Iterable[str],
+        n_variations: int = 1,
+        max_concurrency: int = Settings.BATCH_MAX_CONCURRENCY
+    ) -> Iterator[BatchItem]:
+        """Generate every prompt/variation concurrently, yielding results in completion order
+        
+        Failures are reported per item. Prompts are consumed lazily, so at most
+        max_concurrency requests are in flight regardless of input size.
+        """
+        tasks = (
+            (index, variation, self.variation_prompt(prompt, variation))
+            for index, prompt in enumerate(prompts)
+            for variation in range(n_variations)
+        )
+        pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="generation-batch")
+        in_flight = {}
+        try:
+            for task in tasks:
+                if len(in_flight) >= max_concurrency:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self._batch_item(in_flight.pop(future), future)
+                context = contextvars.copy_context()
+                in_flight[pool.submit(context.run, self.generate_image_or_raise, task[2])] = task
+            
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield self._batch_item(in_flight.pop(future), future)
+        finally:
+            # Consumer stopped early: don't start anything still queued
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    def _batch_item(task, future: Future) -> BatchItem:
+        index, variation, prompt = task
+        item = BatchItem(index=index, variation=variation, prompt=prompt)
+        try:
+            item.image = future.result()
+            if item.image is None:
+                item.error = "No image returned"
+        except Exception as e:
+            item.error = str(e)
+        return item
+    
     @staticmethod
     def validate_connection(api_key: str) -> bool:
         """Test connection"""
         try:
-            client = genai.Client(api_key=api_key)
+            client = get_genai_client(api_key)
             # Simple test call
             response = client.models.generate_content(
                 model="gemini-2.5-flash",
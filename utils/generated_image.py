@@ -0,0 +1,74 @@
+import io
+import threading
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from utils.instrumentation import span
+
+MIME_EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/webp': 'webp',
+    'image/avif': 'avif',
+    'image/gif': 'gif',
+}
+
+
+def sniff_mime_type(data: bytes) -> str:
+    """Detect the image mime type from the leading magic bytes"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'image/avif'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return 'application/octet-stream'
+
+
+class GeneratedImage:
+    """Encoded image bytes exactly as returned by the model
+
+    The original buffer serves both display and download, so nothing is
+    re-encoded; a PIL image is only decoded (once) when pixels are needed.
+    """
+
+    def __init__(self, data: bytes, mime_type: Optional[str] = None, text: Optional[str] = None,
+                 provider: Optional[str] = None):
+        self.data = data
+        self.mime_type = mime_type or sniff_mime_type(data)
+        self.text = text
+        self.provider = provider
+        self._image: Optional[Image.Image] = None
+        self._decode_lock = threading.Lock()
+
+    @property
+    def image(self) -> Image.Image:
+        """Decoded PIL image, decoded lazily on first access"""
+        if self._image is None:
+            with self._decode_lock:
+                if self._image is None:
+                    with span("decode"):
+                        image = Image.open(io.BytesIO(self.data))
+                        image.load()
+                    self._image = image
+        return self._image
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        return self.image.size
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    @property
+    def extension(self) -> str:
+        return MIME_EXTENSIONS.get(self.mime_type, 'bin')
+
+    def file_name(self, stem: str) -> str:
+        return f"{stem}.{self.extension}"
@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Tuple
+
+from config.settings import Settings
+
+
+class GenerationCache:
+    """Disk-backed LRU/TTL cache of generated image bytes, keyed by request hash"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, ttl_seconds: float):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        # key -> (size in bytes, written at); ordered from least to most recently used
+        self._index: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.bin"
+
+    def _load_index(self):
+        """Rebuild the in-memory index from files left by earlier processes"""
+        entries = []
+        for path in self.cache_dir.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            # atime holds the last access (set explicitly on hits), mtime the write time
+            entries.append((stat.st_atime, path.stem, stat.st_size, stat.st_mtime))
+
+        for _, key, size, written_at in sorted(entries):
+            self._index[key] = (size, written_at)
+            self._total_bytes += size
+
+        with self._lock:
+            self._evict_locked()
+
+    def _is_expired(self, written_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - written_at > self.ttl_seconds
+
+    def _remove_locked(self, key: str):
+        size, _ = self._index.pop(key)
+        self._total_bytes -= size
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _evict_locked(self):
+        """Drop expired entries, then least recently used ones until under budget"""
+        for key in [k for k, (_, written_at) in self._index.items() if self._is_expired(written_at)]:
+            self._remove_locked(key)
+            self.evictions += 1
+
+        while self._index and self._total_bytes > self.max_bytes:
+            oldest_key = next(iter(self._index))
+            self._remove_locked(oldest_key)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached bytes for key, or None on a miss"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self._is_expired(entry[1]):
+                self._remove_locked(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path, (time.time(), entry[1]))
+        except FileNotFoundError:
+            # Another process evicted the file underneath us
+            with self._lock:
+                if key in self._index:
+                    self._remove_locked(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store bytes under key, evicting old entries to stay within the byte budget"""
+        size = len(data)
+        if size > self.max_bytes:
+            return
+
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if key in self._index:
+                self._total_bytes -= self._index.pop(key)[0]
+            self._index[key] = (size, time.time())
+            self._total_bytes += size
+            self._evict_locked()
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._lock:
+            for key in list(self._index):
+                self._remove_locked(key)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters and current disk usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._index),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+_cache: Optional[GenerationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_generation_cache() -> GenerationCache:
+    """Process-wide cache shared by every session"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = GenerationCache(
+                Settings.CACHE_DIR,
+                Settings.CACHE_MAX_BYTES,
+                Settings.CACHE_TTL_SECONDS,
+            )
+        return _cache
@@ -0,0 +1,249 @@
+import io
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from config.settings import Settings
+from utils.encoding import get_encoder
+from utils.generated_image import GeneratedImage
+from utils.instrumentation import span
+from utils.phash import HashIndex, get_hash_index, phash
+from utils.thumbnail_atlas import ThumbnailAtlas, contact_sheet
+
+# Metadata values larger than this are dropped from history records
+MAX_META_VALUE_LENGTH = 2000
+
+
+class BlobStore:
+    """Content-addressed image store on local disk, deduplicated across sessions"""
+
+    def __init__(self, root: str, ttl_seconds: float):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+
+    def _path(self, digest: str) -> Path:
+        # Two-level fan-out keeps directories small
+        return self.root / digest[:2] / digest
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if path.exists():
+            # Refresh mtime so shared blobs outlive the TTL while still in use
+            os.utime(path)
+            return digest
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f"{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        return digest
+
+    def exists(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def get(self, digest: str) -> Optional[bytes]:
+        try:
+            return self._path(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def prune(self):
+        """Delete blobs not written or reused within the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        for path in self.root.glob("*/*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class HistoryRecord:
+    """Small in-memory history entry; full image bytes live in the blob store"""
+
+    __slots__ = ('timestamp', 'type', 'digest', 'mime_type', 'meta', 'phash')
+
+    def __init__(self, item_type: str, digest: Optional[str], mime_type: Optional[str], meta: Dict[str, Any]):
+        self.timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.type = item_type
+        self.digest = digest
+        self.mime_type = mime_type
+        self.meta = meta
+        self.phash: Optional[int] = None
+
+
+class HistoryStore:
+    """Per-session history rings backed by a shared blob store and thumbnail atlas
+
+    Thumbnails are made once, when an image is saved, and kept in the atlas.
+    Galleries are drawn from encoded rows of thumbnails, cached up to
+    memory_limit bytes, so full images are only read when one is opened.
+    """
+
+    def __init__(self, blob_store: BlobStore, atlas: ThumbnailAtlas, memory_limit: int):
+        self.blobs = blob_store
+        self.atlas = atlas
+        self.memory_limit = memory_limit
+        self._rows: "OrderedDict[Tuple[Tuple[str, ...], int], GeneratedImage]" = OrderedDict()
+        self._row_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def index(self) -> HashIndex:
+        """Perceptual hash index of stored images, opened on first use"""
+        return get_hash_index("history")
+
+    @staticmethod
+    def _encode_image(image: Any) -> Tuple[Optional[bytes], Optional[str]]:
+        if image is None:
+            return None, None
+        if isinstance(image, GeneratedImage):
+            return image.data, image.mime_type
+        if isinstance(image, (bytes, bytearray)):
+            generated = GeneratedImage(bytes(image))
+            return generated.data, generated.mime_type
+        buffer = io.BytesIO()
+        with span("encode"):
+            image.save(buffer, format="PNG")
+        return buffer.getvalue(), "image/png"
+
+    @staticmethod
+    def _compact_meta(data: Dict[str, Any]) -> Dict[str, Any]:
+        meta = {}
+        for key, value in data.items():
+            if key == 'image':
+                continue
+            if isinstance(value, (int, float, bool)) or value is None:
+                meta[key] = value
+            elif isinstance(value, str) and len(value) <= MAX_META_VALUE_LENGTH:
+                meta[key] = value
+        return meta
+
+    def add(self, history: Deque[HistoryRecord], item_type: str, data: Dict[str, Any]) -> HistoryRecord:
+        """Spill the image to disk and prepend a compact record to the session's ring"""
+        encoded, mime_type = self._encode_image(data.get('image'))
+        digest = self.blobs.put(encoded) if encoded is not None else None
+        record = HistoryRecord(item_type, digest, mime_type, self._compact_meta(data))
+        history.appendleft(record)
+        if encoded is not None:
+            thumbnail = self._make_thumbnail(digest, encoded)
+            # The thumbnail is plenty for a 32x32 hash
+            record.phash = phash(thumbnail)
+            self.index.add(record.phash, digest)
+        return record
+
+    def similar(self, record: HistoryRecord, history: Iterable[HistoryRecord],
+                max_distance: Optional[int] = None) -> List[HistoryRecord]:
+        """Records in history that look like record (perceptual hash), closest first"""
+        if record.phash is None:
+            return []
+        max_distance = Settings.PHASH_SIMILAR_DISTANCE if max_distance is None else max_distance
+        distances = dict(self.index.query(record.phash, max_distance))
+        matches = [other for other in history
+                   if other is not record and other.digest in distances]
+        return sorted(matches, key=lambda other: distances[other.digest])
+
+    def _make_thumbnail(self, digest: str, encoded: bytes) -> Image.Image:
+        thumbnail = self.atlas.get(digest)
+        if thumbnail is not None:
+            return thumbnail
+        with span("thumbnail"):
+            image = Image.open(io.BytesIO(encoded))
+            image.draft('RGB', self.atlas.slot_size)
+            image = image.convert('RGB')
+            image.thumbnail(self.atlas.slot_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        self.atlas.put(digest, image)
+        return image
+
+    def thumbnail(self, record: HistoryRecord) -> Optional[Image.Image]:
+        """Thumbnail for a record from the atlas, rebuilt from disk if its slot was reused"""
+        if record.digest is None:
+            return None
+        thumbnail = self.atlas.get(record.digest)
+        if thumbnail is not None:
+            return thumbnail
+        encoded = self.blobs.get(record.digest)
+        if encoded is None:
+            return None
+        return self._make_thumbnail(record.digest, encoded)
+
+    def gallery_row(self, records: Iterable[HistoryRecord], columns: int) -> Optional[GeneratedImage]:
+        """One encoded image showing up to `columns` records' thumbnails side by side
+
+        Rows are cached by the digests they show, so redrawing a gallery costs
+        no decoding or encoding until its contents change.
+        """
+        records = [record for record in records if record.digest is not None][:columns]
+        if not records:
+            return None
+        key = (tuple(record.digest for record in records), columns)
+        with self._lock:
+            row = self._rows.get(key)
+            if row is not None:
+                self._rows.move_to_end(key)
+                return row
+
+        cell = self.atlas.slot_size
+        blank = Image.new('RGB', (1, 1))
+        thumbnails = [self.thumbnail(record) or blank for record in records]
+        with span("thumbnail"):
+            sheet = contact_sheet(thumbnails, cell, columns)
+        row = get_encoder().encode(sheet, Settings.PREVIEW_FORMAT, 'preview')
+
+        with self._lock:
+            if key not in self._rows:
+                self._rows[key] = row
+                self._row_bytes += row.nbytes
+                while self._row_bytes > self.memory_limit and len(self._rows) > 1:
+                    _, evicted = self._rows.popitem(last=False)
+                    self._row_bytes -= evicted.nbytes
+        return row
+
+    def load(self, record: HistoryRecord) -> Optional[GeneratedImage]:
+        """Full-resolution image for a record, read from disk on demand"""
+        if record.digest is None:
+            return None
+        encoded = self.blobs.get(record.digest)
+        if encoded is None:
+            return None
+        return GeneratedImage(encoded, record.mime_type)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = {
+                'gallery_rows': len(self._rows),
+                'gallery_row_bytes': self._row_bytes,
+                'memory_limit': self.memory_limit,
+            }
+        return {**rows, **{f"atlas_{name}": value for name, value in self.atlas.stats().items()}}
+
+
+def new_history() -> Deque[HistoryRecord]:
+    """Fixed-size ring of history records for one session"""
+    return deque(maxlen=Settings.HISTORY_MAX_ITEMS)
+
+
+_store: Optional[HistoryStore] = None
+_store_lock = threading.Lock()
+
+
+def get_history_store() -> HistoryStore:
+    """Process-wide history store shared by every session"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            blobs = BlobStore(Settings.HISTORY_DIR, Settings.HISTORY_BLOB_TTL_SECONDS)
+            blobs.prune()
+            # The hash index only grows while running; drop entries whose blobs were pruned
+            get_hash_index("history").retain(blobs.exists)
+            atlas = ThumbnailAtlas(Settings.HISTORY_ATLAS_DIR, Settings.HISTORY_THUMBNAIL_SIZE,
+                                   Settings.HISTORY_ATLAS_SLOTS)
+            _store = HistoryStore(blobs, atlas, Settings.HISTORY_MEMORY_LIMIT)
+        return _store
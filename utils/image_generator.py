@@ -1,19 +1,27 @@
-import requests
 import streamlit as st
 from PIL import Image
 import io
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import base64
 
+from config.settings import Settings
+from utils.instrumentation import span
+from utils.startup import lazy_import
+from utils.resilience import (
+    BackendError, CircuitOpenError, RETRYABLE_STATUS_CODES, get_resilient_backend, parse_retry_after
+)
+
 class ImageGenerator:
     """Handle actual image generation using various APIs"""
     
-    def __init__(self):
-        self.huggingface_api_url = "https://api-inference.huggingface.co/models/runwayml/stable-diffusion-v1-5"
+    def __init__(self, image_size: Optional[Tuple[int, int]] = None):
+        self.huggingface_api_url = Settings.HF_API_URL
+        self.image_size = image_size or Settings.HF_IMAGE_SIZE
+        self.backend = get_resilient_backend("huggingface")
         
-    def generate_with_huggingface(self, prompt: str, hf_token: Optional[str] = None) -> Optional[Image.Image]:
-        """Generate image using Hugging Face Inference API"""
+    def _request_huggingface(self, prompt: str, hf_token: Optional[str] = None) -> bytes:
+        """POST to the Hugging Face Inference API; raises BackendError on failure"""
         
         headers = {}
         if hf_token:
@@ -24,30 +32,57 @@ class ImageGenerator:
             "parameters": {
                 "num_inference_steps": 20,
                 "guidance_scale": 7.5,
-                "width": 512,
-                "height": 512
+                "width": self.image_size[0],
+                "height": self.image_size[1]
             }
         }
         
+        requests = lazy_import("requests")
+        with span("network.huggingface"):
+            response = requests.post(
+                self.huggingface_api_url, 
+                headers=headers, 
+                json=payload,
+                timeout=120
+            )
+        
+        if response.status_code == 200:
+            return response.content
+        
+        retry_after = response.headers.get("Retry-After")
+        if response.status_code == 503 and retry_after is None:
+            # Model cold start: the body carries an estimated load time
+            try:
+                retry_after = response.json().get("estimated_time")
+            except ValueError:
+                pass
+        raise BackendError(
+            f"Generation failed: {response.status_code} - {response.text}",
+            status=response.status_code,
+            retryable=response.status_code in RETRYABLE_STATUS_CODES,
+            retry_after=parse_retry_after(retry_after)
+        )
+    
+    def fetch_huggingface(self, prompt: str, hf_token: Optional[str] = None) -> bytes:
+        """Encoded image bytes from Hugging Face, with retries; raises BackendError"""
+        return self.backend.call(self._request_huggingface, prompt, hf_token)
+    
+    def generate_with_huggingface(self, prompt: str, hf_token: Optional[str] = None) -> Optional[Image.Image]:
+        """Generate image using Hugging Face Inference API"""
         try:
             with st.spinner("🎨 Generating image... This may take 30-60 seconds"):
-                response = requests.post(
-                    self.huggingface_api_url, 
-                    headers=headers, 
-                    json=payload,
-                    timeout=120
-                )
-                
-                if response.status_code == 200:
-                    image = Image.open(io.BytesIO(response.content))
-                    return image
-                elif response.status_code == 503:
-                    st.warning("⏳ Model is loading, please wait a moment and try again...")
-                    return None
-                else:
-                    st.error(f"Generation failed: {response.status_code} - {response.text}")
-                    return None
-                    
+                content = self.fetch_huggingface(prompt, hf_token)
+                return Image.open(io.BytesIO(content))
+        
+        except CircuitOpenError as e:
+            st.warning(f"⏳ {e}")
+            return None
+        except BackendError as e:
+            if e.status == 503:
+                st.warning("⏳ Model is still loading, please wait a moment and try again...")
+            else:
+                st.error(str(e))
+            return None
         except Exception as e:
             st.error(f"Error generating image: {str(e)}")
             return None
@@ -2,23 +2,77 @@ import streamlit as st
 from PIL import Image
 import io
 import base64
-from typing import Optional, Tuple
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from config.settings import Settings
+from utils.encoding import get_encoder, offered_formats
+from utils.phash import dhash, phash
+from utils.preprocess import UploadRejected, get_preprocessor
+from utils.process_pool import get_process_pool
+from utils.startup import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Uploads per session whose background preprocessing is kept across reruns
+PENDING_UPLOADS_LIMIT = 8
 
 class ImageUtils:
     """Utility functions for image handling"""
     
     @staticmethod
     def resize_image(image: Image.Image, max_size: Tuple[int, int] = (1024, 1024)) -> Image.Image:
-        """Resize image while maintaining aspect ratio"""
-        image.thumbnail(max_size, Image.Resampling.LANCZOS)
-        return image
+        """Resize image while maintaining aspect ratio
+        
+        Always returns a new image and leaves the argument untouched; large
+        images are resized in a worker process.
+        """
+        resized = get_process_pool().thumbnail(image, max_size)
+        return image.copy() if resized is image else resized
+    
+    @staticmethod
+    def convert_image(image: Image.Image, mode: str) -> Image.Image:
+        """Convert image to mode, in a worker process for large images"""
+        if image.mode == mode:
+            return image.copy()
+        return get_process_pool().convert(image, mode)
+    
+    @staticmethod
+    def to_array(image, mode: str = 'RGB') -> "np.ndarray":
+        """PIL image (or array) as a writable HxWxC uint8 array in the given mode
+        
+        PIL images are copied; arrays already in the right shape are returned as is.
+        """
+        np = lazy_import("numpy")
+        if isinstance(image, np.ndarray):
+            channels = len(mode)
+            if image.ndim == 3 and image.shape[2] == channels:
+                return image
+            image = Image.fromarray(image)
+        if image.mode != mode:
+            image = image.convert(mode)
+        # np.asarray of a PIL image is read-only; edits such as adjust_color(out=...) need to write
+        return np.array(image)
+    
+    @staticmethod
+    def from_array(pixels: "np.ndarray") -> Image.Image:
+        """Wrap a uint8 array as a PIL image"""
+        np = lazy_import("numpy")
+        return Image.fromarray(np.ascontiguousarray(pixels))
     
     @staticmethod
-    def image_to_base64(image: Image.Image) -> str:
-        """Convert PIL Image to base64 string"""
-        buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        return base64.b64encode(buffer.getvalue()).decode()
+    def perceptual_hash(image: Image.Image, kind: str = 'phash') -> int:
+        """64-bit perceptual hash ('phash' or the cheaper 'dhash'); compare with Hamming distance"""
+        return phash(image) if kind == 'phash' else dhash(image)
+    
+    @staticmethod
+    def image_to_base64(image: Image.Image, fmt: Optional[str] = None, tier: str = 'standard') -> str:
+        """Convert PIL Image to base64 string (Settings.PREVIEW_FORMAT unless fmt is given)"""
+        encoded = get_encoder().encode(image, fmt or Settings.PREVIEW_FORMAT, tier)
+        return base64.b64encode(encoded.data).decode()
     
     @staticmethod
     def base64_to_image(base64_string: str) -> Image.Image:
@@ -27,38 +81,95 @@ class ImageUtils:
         return Image.open(io.BytesIO(image_data))
     
     @staticmethod
-    def validate_image(uploaded_file) -> Optional[Image.Image]:
-        """Validate and load uploaded image"""
-        if uploaded_file is not None:
+    def start_preprocess(uploaded_file, target_size: Optional[Tuple[int, int]] = None) -> Optional[Future]:
+        """Start decoding and downscaling an upload on the preprocess pool
+        
+        Call as soon as st.file_uploader returns a file, before rendering the
+        rest of the tab, so the work overlaps the script. The future is kept in
+        session state per file, so reruns pick up the same work.
+        """
+        if uploaded_file is None:
+            return None
+        data = None
+        file_id = getattr(uploaded_file, 'file_id', None)
+        if file_id is None:
+            data = uploaded_file.getvalue() if hasattr(uploaded_file, 'getvalue') else uploaded_file.read()
+            file_id = hashlib.sha256(data).hexdigest()
+        key = (file_id, target_size)
+        
+        pending = st.session_state.setdefault('pending_uploads', OrderedDict())
+        future = pending.get(key)
+        if future is None:
+            if data is None:
+                data = uploaded_file.getvalue()
             try:
-                image = Image.open(uploaded_file)
-                # Convert to RGB if necessary
-                if image.mode != 'RGB':
-                    image = image.convert('RGB')
-                return image
-            except Exception as e:
-                st.error(f"Error loading image: {str(e)}")
+                future = get_preprocessor().preprocess_async(data, target_size)
+            except UploadRejected as e:
+                future = Future()
+                future.set_exception(e)
+            pending[key] = future
+            while len(pending) > PENDING_UPLOADS_LIMIT:
+                pending.popitem(last=False)
+        return future
+    
+    @staticmethod
+    def validate_image(uploaded_file, target_size: Optional[Tuple[int, int]] = None,
+                       wait: bool = True) -> Optional[Image.Image]:
+        """Validate and load uploaded image, downscaled to the model input size
+        
+        Uses the work begun by start_preprocess (starting it if needed) and
+        waits behind a spinner only if it has not finished yet. With
+        wait=False, returns None until the image is ready, for callers that
+        poll from a st.fragment(run_every=...).
+        """
+        try:
+            future = ImageUtils.start_preprocess(uploaded_file, target_size)
+            if future is None:
                 return None
-        return None
+            if not future.done():
+                if not wait:
+                    return None
+                with st.spinner("Preparing image..."):
+                    future.exception()
+            # The future is shared across reruns; callers get their own copy
+            return future.result().copy()
+        except UploadRejected as e:
+            st.error(str(e))
+            return None
+        except Exception as e:
+            st.error(f"Error loading image: {str(e)}")
+            return None
     
     @staticmethod
     def display_image_with_download(image: Image.Image, caption: str = "", key: str = ""):
-        """Display image with download button"""
+        """Display image with download button
+        
+        The browser gets a small preview; the download is encoded in the chosen
+        format. Both encodes run in parallel and are cached across reruns.
+        """
+        encoder = get_encoder()
+        preview = encoder.encode_async(image, Settings.PREVIEW_FORMAT, 'preview', Settings.PREVIEW_MAX_SIZE)
         col1, col2 = st.columns([3, 1])
         
+        with col2:
+            formats = offered_formats()
+            fmt = st.selectbox(
+                "Format",
+                formats,
+                index=formats.index(Settings.DOWNLOAD_FORMAT) if Settings.DOWNLOAD_FORMAT in formats else 0,
+                key=f"format_{key}"
+            )
+            download = encoder.encode_async(image, fmt, 'high')
+        
         with col1:
-            st.image(image, caption=caption, use_column_width=True)
+            st.image(preview.result().data, caption=caption, use_column_width=True)
         
         with col2:
-            # Convert to bytes for download
-            buffer = io.BytesIO()
-            image.save(buffer, format="PNG")
-            buffer.seek(0)
-            
+            encoded = download.result()
             st.download_button(
                 label="📥 Download",
-                data=buffer.getvalue(),
-                file_name=f"generated_image_{key}.png",
-                mime="image/png",
+                data=encoded.data,
+                file_name=encoded.file_name(f"generated_image_{key}"),
+                mime=encoded.mime_type,
                 key=f"download_{key}"
             )
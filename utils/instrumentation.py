@@ -0,0 +1,201 @@
+import json
+import time
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional
+
+from config.settings import Settings
+
+# Upper bounds (seconds) for latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_NAME = "ai_image_editor_span_seconds"
+
+# Session the current thread/task is working for; copied into worker threads by the job queue
+current_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_session', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus style"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate quantile: upper bound of the bucket containing it"""
+        if not self.count:
+            return None
+        target = q * self.count
+        running = 0
+        for i, bucket_count in enumerate(self.counts):
+            running += bucket_count
+            if running >= target:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+
+class Instrumentation:
+    """Process-wide span histograms plus a short per-session breakdown"""
+
+    def __init__(self, session_window: int, max_sessions: int, log_path: Optional[str] = None):
+        self.session_window = session_window
+        self.max_sessions = max_sessions
+        self.log_path = log_path
+        self._histograms: Dict[str, Histogram] = {}
+        self._sessions: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, session_id: Optional[str] = None):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+            if session_id is not None:
+                spans = self._sessions.get(session_id)
+                if spans is None:
+                    spans = self._sessions[session_id] = deque(maxlen=self.session_window)
+                    # Sessions end silently; drop the least recently active ones
+                    while len(self._sessions) > self.max_sessions:
+                        self._sessions.popitem(last=False)
+                else:
+                    self._sessions.move_to_end(session_id)
+                spans.append((name, seconds))
+
+        if self.log_path:
+            line = json.dumps({'ts': time.time(), 'span': name, 'seconds': seconds, 'session': session_id})
+            with self._log_lock:
+                with open(self.log_path, 'a') as log_file:
+                    log_file.write(line + "\n")
+
+    def session_breakdown(self, session_id: str) -> List[Dict[str, Any]]:
+        """Per-span count/total/mean/last over the session's recent spans"""
+        with self._lock:
+            spans = list(self._sessions.get(session_id, ()))
+        rows: Dict[str, Dict[str, Any]] = {}
+        for name, seconds in spans:
+            row = rows.setdefault(name, {'span': name, 'count': 0, 'total_ms': 0.0, 'last_ms': 0.0})
+            row['count'] += 1
+            row['total_ms'] += seconds * 1000
+            row['last_ms'] = seconds * 1000
+        for row in rows.values():
+            row['mean_ms'] = row['total_ms'] / row['count']
+        return sorted(rows.values(), key=lambda row: row['total_ms'], reverse=True)
+
+    def forget_session(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def render_prometheus(self) -> str:
+        """All histograms in Prometheus text exposition format"""
+        with self._lock:
+            snapshot = {
+                name: (list(h.counts), h.sum, h.count) for name, h in self._histograms.items()
+            }
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in instrumented spans",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        for name, (counts, total, count) in sorted(snapshot.items()):
+            running = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                running += bucket_count
+                lines.append(f'{METRIC_NAME}_bucket{{span="{name}",le="{bound}"}} {running}')
+            lines.append(f'{METRIC_NAME}_bucket{{span="{name}",le="+Inf"}} {count}')
+            lines.append(f'{METRIC_NAME}_sum{{span="{name}"}} {total}')
+            lines.append(f'{METRIC_NAME}_count{{span="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    'count': h.count,
+                    'mean_ms': h.sum / h.count * 1000 if h.count else None,
+                    'p50_le_s': h.quantile(0.50),
+                    'p95_le_s': h.quantile(0.95),
+                }
+                for name, h in self._histograms.items()
+            }
+
+
+_instrumentation: Optional[Instrumentation] = None
+_instrumentation_lock = threading.Lock()
+_metrics_server: Optional[ThreadingHTTPServer] = None
+
+
+def get_instrumentation() -> Instrumentation:
+    global _instrumentation
+    with _instrumentation_lock:
+        if _instrumentation is None:
+            _instrumentation = Instrumentation(
+                Settings.METRICS_SESSION_WINDOW,
+                Settings.METRICS_MAX_SESSIONS,
+                Settings.METRICS_LOG_PATH,
+            )
+        return _instrumentation
+
+
+def observe(name: str, seconds: float):
+    """Record a duration measured elsewhere, attributed to the current session"""
+    get_instrumentation().observe(name, seconds, current_session.get())
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time the enclosed block as span `name`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = get_instrumentation().render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: Optional[int] = None) -> Optional[int]:
+    """Serve /metrics on localhost once per process; returns the port, or None if disabled"""
+    global _metrics_server
+    port = Settings.METRICS_PORT if port is None else port
+    if not port:
+        return None
+    with _instrumentation_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsHandler)
+            except OSError:
+                # Another process on this host already serves the port
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _metrics_server.server_address[1]
@@ -0,0 +1,166 @@
+import time
+import uuid
+import threading
+import contextvars
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import Settings
+from utils.progress import GenerationCancelled, GenerationProgress
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the job queue is at capacity"""
+
+
+class Job:
+    """A single background generation job"""
+
+    def __init__(self, job_id: str, label: str):
+        self.id = job_id
+        self.label = label
+        self.status = QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future = None
+        self.progress: Optional[GenerationProgress] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds spent running (or waiting, if not started yet)"""
+        start = self.started_at or self.submitted_at
+        end = self.finished_at or time.time()
+        return end - start
+
+
+class JobQueue:
+    """Bounded worker pool running generation jobs outside the Streamlit script thread"""
+
+    def __init__(self, max_workers: int, max_pending: int, retention_seconds: float):
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def _pending_count_locked(self) -> int:
+        return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def _prune_locked(self):
+        """Forget finished jobs nobody picked up within the retention window"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, fn: Callable[..., Any], *args, label: str = "",
+               progress: Optional[GenerationProgress] = None, **kwargs) -> str:
+        """Schedule fn(*args, **kwargs) and return the new job id
+
+        Pass the same progress object fn writes to so the UI can show partial
+        output and cancel the job while it runs.
+        """
+        with self._lock:
+            self._prune_locked()
+            if self._pending_count_locked() >= self.max_pending:
+                raise QueueFullError("Too many generations in progress, please wait a moment")
+            job = Job(uuid.uuid4().hex, label)
+            job.progress = progress
+            self._jobs[job.id] = job
+
+        # Carry context variables (e.g. the instrumentation session) into the worker
+        context = contextvars.copy_context()
+        job.future = self._executor.submit(context.run, self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job: Job, fn: Callable[..., Any], args, kwargs):
+        if job.status == CANCELLED:
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(*args, **kwargs)
+            status = DONE
+        except GenerationCancelled:
+            status = CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            status = FAILED
+        # finished_at before the status: other threads treat a finished status as having one
+        job.finished_at = time.time()
+        job.status = status
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or ask a running one to stop via its progress object"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if job.status == RUNNING and job.progress is not None:
+            job.progress.cancel()
+            return True
+        if job.status != QUEUED:
+            return False
+        if job.future is not None and not job.future.cancel():
+            return False
+        job.finished_at = time.time()
+        job.status = CANCELLED
+        return True
+
+    def forget(self, job_id: str):
+        """Drop a job once its result has been consumed"""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Process-wide job queue shared by every session"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(
+                Settings.JOB_MAX_WORKERS,
+                Settings.JOB_MAX_PENDING,
+                Settings.JOB_RETENTION_SECONDS,
+            )
+        return _queue
+
+
+def session_jobs(session_key: str = 'generation_jobs') -> List[str]:
+    """Job ids owned by the current Streamlit session, newest first"""
+    if session_key not in st.session_state:
+        st.session_state[session_key] = []
+    return st.session_state[session_key]
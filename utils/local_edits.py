@@ -0,0 +1,129 @@
+import cv2
+import numpy as np
+from PIL import Image
+from typing import Optional, Tuple, Union
+
+from utils.image_utils import ImageUtils
+
+# Local stand-ins for BACKGROUND_OPTIONS backdrops that are simple enough not to need the model
+LOCAL_BACKDROPS = {
+    "Product Studio": ((255, 255, 255), (255, 255, 255)),
+    "Studio Professional": ((214, 214, 214), (150, 150, 150)),
+}
+
+
+class LocalEditEngine:
+    """Vectorized NumPy/OpenCV edits that run in milliseconds without a model call
+
+    All operations take and return HxWxC uint8 arrays; convert once at the
+    edges with ImageUtils.to_array (a writable copy, so in-place edits such
+    as adjust_color(..., out=pixels) work) and ImageUtils.from_array, and
+    chain edits on the array in between.
+    """
+
+    @staticmethod
+    def crop(pixels: np.ndarray, box: Tuple[int, int, int, int]) -> np.ndarray:
+        """Crop to (left, top, right, bottom); returns a view, no copy"""
+        left, top, right, bottom = box
+        return pixels[top:bottom, left:right]
+
+    @staticmethod
+    def smart_crop(pixels: np.ndarray, aspect_ratio: float) -> np.ndarray:
+        """Crop to aspect_ratio (w/h), keeping the window with the most edge energy"""
+        height, width = pixels.shape[:2]
+        if width / height > aspect_ratio:
+            crop_w, crop_h = int(round(height * aspect_ratio)), height
+        else:
+            crop_w, crop_h = width, int(round(width / aspect_ratio))
+
+        gray = cv2.cvtColor(pixels[..., :3], cv2.COLOR_RGB2GRAY)
+        energy = np.abs(cv2.Laplacian(gray, cv2.CV_32F))
+
+        # Slide along the one free axis using a prefix sum of column/row energy
+        if crop_w < width:
+            profile = np.concatenate(([0.0], np.cumsum(energy.sum(axis=0))))
+            scores = profile[crop_w:] - profile[:-crop_w]
+            left = int(np.argmax(scores))
+            return pixels[:, left:left + crop_w]
+        profile = np.concatenate(([0.0], np.cumsum(energy.sum(axis=1))))
+        scores = profile[crop_h:] - profile[:-crop_h]
+        top = int(np.argmax(scores))
+        return pixels[top:top + crop_h, :]
+
+    @staticmethod
+    def resize(pixels: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+        """Resize to (width, height); INTER_AREA when shrinking, INTER_CUBIC when enlarging"""
+        height, width = pixels.shape[:2]
+        shrinking = size[0] * size[1] < width * height
+        return cv2.resize(pixels, size, interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_CUBIC)
+
+    @staticmethod
+    def adjust_color(pixels: np.ndarray, brightness: float = 0.0, contrast: float = 1.0,
+                     saturation: float = 1.0, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Brightness offset (-1..1), contrast and saturation gains applied in one pass
+
+        Pass out=pixels to adjust in place.
+        """
+        rgb = pixels[..., :3].astype(np.float32)
+        if saturation != 1.0:
+            gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+            rgb -= gray[..., None]
+            rgb *= saturation
+            rgb += gray[..., None]
+        if contrast != 1.0:
+            rgb -= 127.5
+            rgb *= contrast
+            rgb += 127.5
+        if brightness:
+            rgb += brightness * 255.0
+
+        if out is None:
+            out = pixels.copy()
+        np.clip(rgb, 0, 255, out=rgb)
+        out[..., :3] = rgb
+        return out
+
+    @staticmethod
+    def sharpen(pixels: np.ndarray, amount: float = 1.0, radius: float = 1.5) -> np.ndarray:
+        """Unsharp mask: original + amount * (original - blurred)"""
+        blurred = cv2.GaussianBlur(pixels, (0, 0), radius)
+        return cv2.addWeighted(pixels, 1.0 + amount, blurred, -amount, 0)
+
+    @staticmethod
+    def backdrop(name: str, size: Tuple[int, int]) -> Optional[np.ndarray]:
+        """Locally rendered backdrop for a BACKGROUND_OPTIONS key, None if it needs the model"""
+        colors = LOCAL_BACKDROPS.get(name)
+        if colors is None:
+            return None
+        width, height = size
+        top, bottom = (np.array(c, dtype=np.float32) for c in colors)
+        # Vertical gradient, broadcast across the width
+        t = np.linspace(0.0, 1.0, height, dtype=np.float32)[:, None, None]
+        column = (top * (1 - t) + bottom * t).astype(np.uint8)
+        return np.ascontiguousarray(np.broadcast_to(column, (height, width, 3)))
+
+    @staticmethod
+    def composite(foreground: np.ndarray, background: np.ndarray) -> np.ndarray:
+        """Alpha-composite an RGBA foreground (e.g. a Smart Remove cutout) over an RGB background"""
+        height, width = foreground.shape[:2]
+        if background.shape[:2] != (height, width):
+            background = LocalEditEngine.resize(background, (width, height))
+
+        alpha = foreground[..., 3:4].astype(np.float32) * (1.0 / 255.0)
+        result = background[..., :3].astype(np.float32)
+        result -= alpha * result
+        result += alpha * foreground[..., :3]
+        return result.astype(np.uint8)
+
+    @staticmethod
+    def replace_background(cutout: Union[Image.Image, np.ndarray], background: Union[str, Image.Image, np.ndarray]) -> Image.Image:
+        """Place a transparent cutout on a named local backdrop or a provided background image"""
+        foreground = ImageUtils.to_array(cutout, mode='RGBA')
+        height, width = foreground.shape[:2]
+        if isinstance(background, str):
+            backdrop = LocalEditEngine.backdrop(background, (width, height))
+            if backdrop is None:
+                raise ValueError(f"Background '{background}' needs to be generated by the model")
+        else:
+            backdrop = ImageUtils.to_array(background, mode='RGB')
+        return ImageUtils.from_array(LocalEditEngine.composite(foreground, backdrop))
@@ -0,0 +1,282 @@
+import os
+import functools
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Tuple
+
+from PIL import Image
+
+from config.settings import Settings
+from utils.instrumentation import span
+from utils.startup import lazy_import
+
+if TYPE_CHECKING:
+    import numpy as np
+
+HASH_SIZE = 8  # 8x8 = 64-bit hashes
+PHASH_SAMPLE = 32  # pHash takes the DCT of a 32x32 grayscale thumbnail
+
+
+def _grayscale(image: Image.Image, size: Tuple[int, int]) -> "np.ndarray":
+    np = lazy_import("numpy")
+    small = image.convert('L').resize(size, Image.Resampling.BOX)
+    return np.asarray(small, dtype=np.float32)
+
+
+@functools.lru_cache(maxsize=None)
+def _dct_matrix(n: int) -> "np.ndarray":
+    """Orthonormal DCT-II basis, so DCT(X) = D @ X @ D.T"""
+    np = lazy_import("numpy")
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+def _pack(bits: "np.ndarray") -> "np.ndarray":
+    """(N, 64) booleans to N uint64 values, first bit most significant"""
+    np = lazy_import("numpy")
+    packed = np.packbits(bits.reshape(len(bits), -1).astype(np.uint8), axis=1)
+    return packed.view('>u8').ravel().astype(np.uint64)
+
+
+def phash_arrays(pixels: "np.ndarray") -> "np.ndarray":
+    """pHash of a stack of (N, 32, 32) grayscale thumbnails in one vectorized pass"""
+    np = lazy_import("numpy")
+    dct = _dct_matrix(PHASH_SAMPLE)
+    coefficients = np.einsum('kn,inm,lm->ikl', dct, pixels, dct, optimize=True)
+    low = coefficients[:, :HASH_SIZE, :HASH_SIZE].reshape(len(pixels), -1)
+    # Median of the AC terms; the DC term only reflects overall brightness
+    median = np.median(low[:, 1:], axis=1, keepdims=True)
+    return _pack(low > median)
+
+
+def dhash_arrays(pixels: "np.ndarray") -> "np.ndarray":
+    """dHash of a stack of (N, 8, 9) grayscale thumbnails: sign of horizontal gradients"""
+    return _pack(pixels[:, :, 1:] > pixels[:, :, :-1])
+
+
+def phash(image: Image.Image) -> int:
+    """64-bit DCT perceptual hash; robust to rescaling, recompression and small edits"""
+    with span("phash"):
+        return int(phash_arrays(_grayscale(image, (PHASH_SAMPLE, PHASH_SAMPLE))[None])[0])
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash; cheaper than pHash, a little less robust"""
+    with span("phash"):
+        return int(dhash_arrays(_grayscale(image, (HASH_SIZE + 1, HASH_SIZE))[None])[0])
+
+
+def hash_many(images: Iterable[Image.Image], kind: str = 'phash') -> "np.ndarray":
+    """Hash many images with one vectorized transform"""
+    np = lazy_import("numpy")
+    size = (PHASH_SAMPLE, PHASH_SAMPLE) if kind == 'phash' else (HASH_SIZE + 1, HASH_SIZE)
+    stack = np.stack([_grayscale(image, size) for image in images])
+    return phash_arrays(stack) if kind == 'phash' else dhash_arrays(stack)
+
+
+def popcount(values: "np.ndarray") -> "np.ndarray":
+    """Set bits per uint64"""
+    np = lazy_import("numpy")
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    table = _popcount_table()
+    return table[values.view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+
+@functools.lru_cache(maxsize=None)
+def _popcount_table() -> "np.ndarray":
+    np = lazy_import("numpy")
+    return np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+@functools.lru_cache(maxsize=None)
+def _flip_masks(bits: int, radius: int) -> "np.ndarray":
+    """Every `bits`-bit XOR mask with at most `radius` bits set"""
+    np = lazy_import("numpy")
+    masks = [0]
+    if radius >= 1:
+        masks += [1 << i for i in range(bits)]
+    if radius >= 2:
+        masks += [(1 << i) | (1 << j) for i in range(bits) for j in range(i + 1, bits)]
+    return np.array(masks, dtype=np.uint64)
+
+
+class HashIndex:
+    """On-disk index of 64-bit perceptual hashes with Hamming lookup
+
+    Hashes and their keys (hex SHA-256 digests) are stored as flat uint64 and
+    32-byte arrays. Lookups use multi-index hashing: the hash is split into
+    bands with a sorted table per band. Any match within distance r agrees
+    with the query to within r // bands bits in at least one band, so probing
+    those few band values via binary search finds every candidate without
+    scanning the whole index. New entries sit in a small tail that is scanned
+    directly and merged into the tables in batches. Entries are only
+    removed by retain(), which rewrites the files.
+    """
+
+    BANDS = 4
+    BAND_BITS = 64 // BANDS
+    MAX_PROBE_RADIUS = 2  # per band; wider queries fall back to a vectorized scan
+
+    def __init__(self, root: str, merge_threshold: int = 4096):
+        np = lazy_import("numpy")
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.merge_threshold = merge_threshold
+        self._hash_path = self.root / "hashes.u64"
+        self._key_path = self.root / "keys.bin"
+        self._lock = threading.Lock()
+
+        hashes = np.fromfile(self._hash_path, dtype='<u8') if self._hash_path.exists() else np.empty(0, np.uint64)
+        keys = np.fromfile(self._key_path, dtype=np.uint8) if self._key_path.exists() else np.empty(0, np.uint8)
+        keys = keys[:len(keys) // 32 * 32].reshape(-1, 32)
+        count = min(len(hashes), len(keys))
+        if count != len(hashes) or count != len(keys):
+            # A crash between the two appends: drop the unmatched tail
+            hashes, keys = hashes[:count], keys[:count]
+            hashes.astype('<u8').tofile(self._hash_path)
+            keys.tofile(self._key_path)
+        self._hashes = hashes.astype(np.uint64)
+        self._keys = keys
+        self._tail_hashes: List[int] = []
+        self._tail_keys: List[bytes] = []
+        self._build_tables()
+
+    def _build_tables(self):
+        np = lazy_import("numpy")
+        self._tables = []
+        for band in range(self.BANDS):
+            values = (self._hashes >> np.uint64(band * self.BAND_BITS)) & np.uint64((1 << self.BAND_BITS) - 1)
+            order = np.argsort(values, kind='stable')
+            self._tables.append((values[order], order))
+
+    def _merge_locked(self):
+        np = lazy_import("numpy")
+        self._hashes = np.concatenate([self._hashes, np.array(self._tail_hashes, dtype=np.uint64)])
+        tail_keys = np.frombuffer(b"".join(self._tail_keys), dtype=np.uint8).reshape(-1, 32)
+        self._keys = np.concatenate([self._keys, tail_keys])
+        self._tail_hashes, self._tail_keys = [], []
+        self._build_tables()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._hashes) + len(self._tail_hashes)
+
+    def add(self, value: int, key: str):
+        """Record hash value for key (a hex SHA-256 digest); exact repeats are skipped"""
+        np = lazy_import("numpy")
+        raw_key = bytes.fromhex(key)
+        with self._lock:
+            # Checked under the same lock as the append, so concurrent adds can't both miss
+            hashes, keys = self._gather_locked(value, 0)
+            same_hash = keys[hashes == np.uint64(value)]
+            if (same_hash == np.frombuffer(raw_key, dtype=np.uint8)).all(axis=1).any():
+                return
+            with open(self._hash_path, "ab") as f:
+                f.write(np.array([value], dtype='<u8').tobytes())
+            with open(self._key_path, "ab") as f:
+                f.write(raw_key)
+            self._tail_hashes.append(value)
+            self._tail_keys.append(raw_key)
+            if len(self._tail_hashes) >= self.merge_threshold:
+                self._merge_locked()
+
+    def retain(self, keep: Callable[[str], bool]) -> int:
+        """Drop entries whose key fails keep(key) and rewrite the files; returns how many were dropped
+
+        The index is append-only between calls, so run this against the store
+        the keys point into (e.g. at startup, after pruning it).
+        """
+        np = lazy_import("numpy")
+        with self._lock:
+            if self._tail_hashes:
+                self._merge_locked()
+            mask = np.array([keep(key.tobytes().hex()) for key in self._keys], dtype=bool)
+            dropped = int(len(mask) - mask.sum())
+            if not dropped:
+                return 0
+            self._hashes = self._hashes[mask]
+            self._keys = self._keys[mask]
+            for path, data in ((self._hash_path, self._hashes.astype('<u8')), (self._key_path, self._keys)):
+                tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                data.tofile(tmp_path)
+                os.replace(tmp_path, path)
+            self._build_tables()
+            return dropped
+
+    def _candidates_locked(self, value: int, max_distance: int) -> "np.ndarray":
+        np = lazy_import("numpy")
+        probe_radius = max_distance // self.BANDS
+        if probe_radius > self.MAX_PROBE_RADIUS:
+            return np.arange(len(self._hashes))
+        masks = _flip_masks(self.BAND_BITS, probe_radius)
+        band_mask = (1 << self.BAND_BITS) - 1
+        ranges = []
+        for band, (values, order) in enumerate(self._tables):
+            probes = np.uint64((value >> (band * self.BAND_BITS)) & band_mask) ^ masks
+            starts = np.searchsorted(values, probes, side='left')
+            ends = np.searchsorted(values, probes, side='right')
+            ranges.extend(order[start:end] for start, end in zip(starts, ends) if end > start)
+        if not ranges:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(ranges))
+
+    def _gather_locked(self, value: int, max_distance: int) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Hashes and keys of the candidate rows plus the whole unmerged tail"""
+        np = lazy_import("numpy")
+        rows = self._candidates_locked(value, max_distance)
+        hashes = self._hashes[rows]
+        keys = self._keys[rows]
+        if self._tail_hashes:
+            hashes = np.concatenate([hashes, np.array(self._tail_hashes, dtype=np.uint64)])
+            tail_keys = np.frombuffer(b"".join(self._tail_keys), dtype=np.uint8).reshape(-1, 32)
+            keys = np.concatenate([keys, tail_keys])
+        return hashes, keys
+
+    def query(self, value: int, max_distance: int, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(key, distance) pairs within max_distance bits, nearest first"""
+        np = lazy_import("numpy")
+        query = np.uint64(value)
+        with self._lock:
+            hashes, keys = self._gather_locked(value, max_distance)
+        distances = popcount(hashes ^ query)
+        matches = np.flatnonzero(distances <= max_distance)
+        matches = matches[np.argsort(distances[matches], kind='stable')]
+        if limit is not None:
+            matches = matches[:limit]
+        return [(keys[i].tobytes().hex(), int(distances[i])) for i in matches]
+
+    def nearest(self, value: int, max_distance: int) -> Optional[Tuple[str, int]]:
+        matches = self.query(value, max_distance, limit=1)
+        return matches[0] if matches else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._hashes) + len(self._tail_hashes),
+                'unmerged': len(self._tail_hashes),
+                'bytes_on_disk': len(self._hashes) * 40 + len(self._tail_hashes) * 40,
+            }
+
+
+_indexes: Dict[str, HashIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_hash_index(name: str) -> HashIndex:
+    """Process-wide index by name, e.g. 'uploads' or 'history'"""
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None:
+            index = HashIndex(os.path.join(Settings.PHASH_INDEX_DIR, name))
+            _indexes[name] = index
+        return index
+
+
+def get_hash_index_stats() -> Dict[str, Dict[str, int]]:
+    with _indexes_lock:
+        indexes = dict(_indexes)
+    return {name: index.stats() for name, index in indexes.items()}
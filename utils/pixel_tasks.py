@@ -0,0 +1,77 @@
+"""CPU-bound image tasks executed inside ProcessImagePool workers
+
+Kept free of Streamlit and app imports so spawned workers start quickly.
+Pixels travel through shared memory blocks described by (name, mode, width,
+height); only these small descriptors and parameters are pickled.
+"""
+import io
+import sys
+from multiprocessing import shared_memory
+from typing import Any, Dict, Tuple, Union
+
+from PIL import Image
+
+BufferSpec = Tuple[str, str, int, int]  # shared memory name, PIL mode, width, height
+
+BYTES_PER_PIXEL = {'L': 1, 'RGB': 3, 'RGBA': 4}
+
+
+def attach(name: str) -> shared_memory.SharedMemory:
+    """Open an existing block created by the parent, which also unlinks it
+
+    Before 3.13 attaching registers the block with the resource tracker, but
+    spawned workers share the parent's tracker, where a repeat registration
+    is harmless. Unregistering here would drop the parent's own entry.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def _read(spec: BufferSpec) -> Image.Image:
+    name, mode, width, height = spec
+    block = attach(name)
+    view = block.buf[:width * height * BYTES_PER_PIXEL[mode]]
+    try:
+        # frombytes copies, so nothing references the block once it is closed
+        return Image.frombytes(mode, (width, height), view)
+    finally:
+        view.release()
+        block.close()
+
+
+def _write(image: Image.Image, spec: BufferSpec):
+    name, mode, width, height = spec
+    block = attach(name)
+    try:
+        data = image.tobytes()
+        block.buf[:len(data)] = data
+    finally:
+        block.close()
+
+
+def resize_task(source: BufferSpec, target: BufferSpec):
+    """LANCZOS resize of source into target's dimensions"""
+    image = _read(source)
+    _write(image.resize((target[2], target[3]), Image.Resampling.LANCZOS, reducing_gap=2.0), target)
+
+
+def convert_task(source: BufferSpec, target: BufferSpec):
+    """Mode conversion of source into target's mode"""
+    _write(_read(source).convert(target[1]), target)
+
+
+def encode_task(source: BufferSpec, target_name: str, capacity: int, fmt: str,
+                params: Dict[str, Any]) -> Union[int, bytes]:
+    """Encode source; returns the length written to the target block, or the bytes if they don't fit"""
+    buffer = io.BytesIO()
+    _read(source).save(buffer, format=fmt, **params)
+    data = buffer.getbuffer()
+    if len(data) > capacity:
+        return bytes(data)
+    block = attach(target_name)
+    try:
+        block.buf[:len(data)] = data
+    finally:
+        block.close()
+    return len(data)
@@ -0,0 +1,179 @@
+import io
+import hashlib
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from config.settings import Settings
+from utils.instrumentation import current_session
+from utils.phash import phash
+
+# Sessions whose recent upload fingerprints are kept for similarity hints
+MAX_TRACKED_SESSIONS = 256
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload is too large or not a supported image"""
+
+
+class UploadPreprocessor:
+    """Bounded decode, downscale and RGB normalization of uploads for model input
+
+    Byte size and header dimensions are checked before any pixel data is
+    decoded; JPEGs are decoded at reduced scale via draft(), and normalized
+    results are cached by content hash. Only exact content matches share a
+    result; perceptually similar uploads from the same session are noted as
+    hints (see similar_upload) but always get their own pixels.
+    """
+
+    def __init__(self, max_bytes: int, max_pixels: int, target_size: Tuple[int, int],
+                 workers: int, cache_entries: int):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.target_size = target_size
+        self.cache_entries = cache_entries
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preprocess")
+        self._cache: "OrderedDict[str, Tuple[Image.Image, int]]" = OrderedDict()
+        self._session_uploads: "OrderedDict[Optional[str], Deque[Tuple[int, str]]]" = OrderedDict()
+        self._hints: "OrderedDict[Tuple[Optional[str], str], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.similar_uploads = 0
+
+    def _check_header(self, image: Image.Image):
+        fmt = (image.format or "").lower()
+        if fmt == 'mpo':
+            # Multi-picture JPEGs from phone cameras; the first frame is a plain JPEG
+            fmt = 'jpeg'
+        if fmt not in Settings.SUPPORTED_FORMATS:
+            raise UploadRejected(f"Unsupported image format: {fmt or 'unknown'}")
+        width, height = image.size
+        if width * height > self.max_pixels:
+            raise UploadRejected(
+                f"Image is {width}x{height} ({width * height / 1e6:.0f} MP), "
+                f"max is {self.max_pixels / 1e6:.0f} MP"
+            )
+
+    def _normalize(self, data: bytes, target_size: Tuple[int, int]) -> Image.Image:
+        try:
+            # Image.open only parses the header; pixels are decoded on load()
+            image = Image.open(io.BytesIO(data))
+        except Exception as e:
+            raise UploadRejected(f"Error loading image: {e}") from e
+        self._check_header(image)
+
+        if image.format in ('JPEG', 'MPO'):
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale when that still covers the target
+            image.draft('RGB', target_size)
+
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.thumbnail(target_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        return image
+
+    def _cache_key(self, data: bytes, target_size: Tuple[int, int]) -> str:
+        digest = hashlib.sha256(data)
+        digest.update(f"{target_size[0]}x{target_size[1]}".encode())
+        return digest.hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[Tuple[Image.Image, int]]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _cache_put(self, key: str, entry: Tuple[Image.Image, int]):
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def preprocess_async(self, data: bytes, target_size: Optional[Tuple[int, int]] = None) -> Future:
+        """Start preprocessing on the worker pool; the future yields an RGB PIL image"""
+        if len(data) > self.max_bytes:
+            raise UploadRejected(
+                f"File is {len(data) / (1024 * 1024):.1f}MB, max is {self.max_bytes // (1024 * 1024)}MB"
+            )
+
+        target_size = target_size or self.target_size
+        key = self._cache_key(data, target_size)
+        session = current_session.get()
+        cached = self._cache_get(key)
+        if cached is not None:
+            image, fingerprint = cached
+            self._note_upload(session, key, fingerprint)
+            future: Future = Future()
+            future.set_result(image.copy())
+            return future
+
+        def run() -> Image.Image:
+            image = self._normalize(data, target_size)
+            fingerprint = phash(image)
+            self._cache_put(key, (image, fingerprint))
+            self._note_upload(session, key, fingerprint)
+            return image.copy()
+
+        return self._executor.submit(run)
+
+    def _note_upload(self, session: Optional[str], key: str, fingerprint: int):
+        """Record a session's upload and hint at its closest earlier look-alike in that session"""
+        with self._lock:
+            uploads = self._session_uploads.get(session)
+            if uploads is None:
+                uploads = self._session_uploads[session] = deque(maxlen=Settings.HISTORY_MAX_ITEMS)
+            self._session_uploads.move_to_end(session)
+            while len(self._session_uploads) > MAX_TRACKED_SESSIONS:
+                stale, _ = self._session_uploads.popitem(last=False)
+                for hint in [hint for hint in self._hints if hint[0] == stale]:
+                    del self._hints[hint]
+
+            similar, best = None, Settings.PHASH_DUPLICATE_DISTANCE + 1
+            for earlier_fingerprint, earlier_key in uploads:
+                distance = bin(fingerprint ^ earlier_fingerprint).count('1')
+                if earlier_key != key and distance < best:
+                    similar, best = earlier_key, distance
+            if all(earlier_key != key for _, earlier_key in uploads):
+                uploads.append((fingerprint, key))
+            if similar is not None and (session, key) not in self._hints:
+                self._hints[(session, key)] = similar
+                self.similar_uploads += 1
+                while len(self._hints) > self.cache_entries:
+                    self._hints.popitem(last=False)
+
+    def similar_upload(self, data: bytes, target_size: Optional[Tuple[int, int]] = None) -> Optional[str]:
+        """Cache key of an earlier upload in this session that looks like data, if any
+
+        A hint only, e.g. for "you uploaded a similar photo before"; pixels
+        are never shared between different uploads.
+        """
+        key = self._cache_key(data, target_size or self.target_size)
+        with self._lock:
+            return self._hints.get((current_session.get(), key))
+
+    def preprocess(self, data: bytes, target_size: Optional[Tuple[int, int]] = None) -> Image.Image:
+        """Preprocess and wait for the result"""
+        return self.preprocess_async(data, target_size).result()
+
+
+_preprocessor: Optional[UploadPreprocessor] = None
+_preprocessor_lock = threading.Lock()
+
+
+def get_preprocessor() -> UploadPreprocessor:
+    """Process-wide preprocessor shared by every session"""
+    global _preprocessor
+    with _preprocessor_lock:
+        if _preprocessor is None:
+            _preprocessor = UploadPreprocessor(
+                Settings.MAX_IMAGE_SIZE,
+                Settings.MAX_IMAGE_PIXELS,
+                Settings.MODEL_INPUT_SIZE,
+                Settings.PREPROCESS_WORKERS,
+                Settings.PREPROCESS_CACHE_ENTRIES,
+            )
+        return _preprocessor
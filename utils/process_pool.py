@@ -0,0 +1,262 @@
+import io
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from config.settings import Settings
+from utils import pixel_tasks
+from utils.instrumentation import span
+from utils.pixel_tasks import BYTES_PER_PIXEL, BufferSpec
+
+
+# image.info entries that Image.save falls back to when not given as parameters
+ENCODE_INFO_KEYS = ('icc_profile', 'dpi', 'transparency')
+
+
+class PoolBusy(RuntimeError):
+    """Raised when the process pool stayed at its pending-task limit for too long"""
+
+
+def thumbnail_size(size: Tuple[int, int], max_size: Tuple[int, int]) -> Tuple[int, int]:
+    """Dimensions Image.thumbnail would produce: fit within max_size, keep aspect, never enlarge"""
+    width, height = size
+    if width <= max_size[0] and height <= max_size[1]:
+        return size
+    scale = min(max_size[0] / width, max_size[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class ProcessImagePool:
+    """Process pool for CPU-bound pixel work, fed through shared memory
+
+    Pixels are copied once into a shared memory block and results come back
+    the same way, so only small descriptors are pickled. A semaphore bounds
+    pending tasks (callers block, then get PoolBusy), workers are replaced
+    after max_tasks_per_child tasks, and a crashed pool is rebuilt on next
+    use. Images below min_pixels are processed in the calling thread, where
+    IPC would cost more than it saves, and so are modes other than L, RGB and
+    RGBA, so a result never depends on whether it was offloaded.
+    """
+
+    def __init__(self, workers: int, max_pending: int, max_tasks_per_child: int,
+                 min_pixels: int, submit_timeout: float):
+        self.workers = workers
+        self.max_tasks_per_child = max_tasks_per_child
+        self.min_pixels = min_pixels
+        self.submit_timeout = submit_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self.metrics = {'offloaded': 0, 'inline': 0, 'busy': 0, 'restarts': 0, 'failures': 0}
+
+    def _count(self, metric: str):
+        with self._metrics_lock:
+            self.metrics[metric] += 1
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs server threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    max_tasks_per_child=self.max_tasks_per_child,
+                )
+            return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        self._count('restarts')
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def offloads(self, image: Image.Image) -> bool:
+        return (self.workers > 0 and image.mode in BYTES_PER_PIXEL
+                and image.width * image.height >= self.min_pixels)
+
+    @staticmethod
+    def _allocate(mode: str, width: int, height: int) -> Tuple[shared_memory.SharedMemory, BufferSpec]:
+        block = shared_memory.SharedMemory(create=True, size=max(1, width * height * BYTES_PER_PIXEL[mode]))
+        return block, (block.name, mode, width, height)
+
+    @classmethod
+    def _share(cls, image: Image.Image) -> Tuple[shared_memory.SharedMemory, BufferSpec]:
+        block, spec = cls._allocate(image.mode, image.width, image.height)
+        data = image.tobytes()
+        block.buf[:len(data)] = data
+        return block, spec
+
+    @staticmethod
+    def _read_image(block: shared_memory.SharedMemory, spec: BufferSpec) -> Image.Image:
+        _, mode, width, height = spec
+        view = block.buf[:width * height * BYTES_PER_PIXEL[mode]]
+        try:
+            return Image.frombytes(mode, (width, height), view)
+        finally:
+            view.release()
+
+    @staticmethod
+    def _release(blocks: List[shared_memory.SharedMemory]):
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    def _submit(self, fn: Callable[..., Any], args: tuple, blocks: List[shared_memory.SharedMemory],
+                finish: Callable[[Any], Any]) -> Future:
+        """Run fn(*args) in a worker; finish(result) builds the value while the blocks still exist"""
+        if not self._slots.acquire(timeout=self.submit_timeout):
+            self._count('busy')
+            self._release(blocks)
+            raise PoolBusy(f"Image worker pool busy for {self.submit_timeout:.0f}s")
+
+        outer: Future = Future()
+        try:
+            executor = self._get_executor()
+            try:
+                inner = executor.submit(fn, *args)
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                executor = self._get_executor()
+                inner = executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            self._release(blocks)
+            raise
+        self._count('offloaded')
+
+        def done(inner: Future):
+            try:
+                outer.set_result(finish(inner.result()))
+            except BrokenProcessPool as e:
+                self._count('failures')
+                self._discard_executor(executor)
+                outer.set_exception(e)
+            except BaseException as e:
+                self._count('failures')
+                outer.set_exception(e)
+            finally:
+                self._release(blocks)
+                self._slots.release()
+
+        inner.add_done_callback(done)
+        return outer
+
+    def _inline(self, fn: Callable[[], Any]) -> Future:
+        self._count('inline')
+        future: Future = Future()
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+    def resize_async(self, image: Image.Image, size: Tuple[int, int]) -> Future:
+        """LANCZOS resize to exactly size (width, height)"""
+        if not self.offloads(image):
+            return self._inline(lambda: image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0))
+        source, source_spec = self._share(image)
+        target, target_spec = self._allocate(image.mode, *size)
+
+        def finish(_):
+            resized = self._read_image(target, target_spec)
+            # Image.resize keeps info (ICC profile, dpi...); match it
+            resized.info = dict(image.info)
+            return resized
+
+        return self._submit(pixel_tasks.resize_task, (source_spec, target_spec), [source, target], finish)
+
+    def thumbnail_async(self, image: Image.Image, max_size: Tuple[int, int]) -> Future:
+        """Like Image.thumbnail, but returns a new image instead of resizing in place"""
+        size = thumbnail_size(image.size, max_size)
+        if size == image.size:
+            return self._inline(lambda: image)
+        return self.resize_async(image, size)
+
+    def convert_async(self, image: Image.Image, mode: str) -> Future:
+        """Mode conversion; offloaded for L/RGB/RGBA targets"""
+        if not self.offloads(image) or mode not in BYTES_PER_PIXEL:
+            return self._inline(lambda: image.convert(mode))
+        source, source_spec = self._share(image)
+        target, target_spec = self._allocate(mode, image.width, image.height)
+
+        def finish(_):
+            converted = self._read_image(target, target_spec)
+            # As Image.convert: keep info, except transparency, which is per-mode
+            converted.info = {key: value for key, value in image.info.items() if key != 'transparency'}
+            return converted
+
+        return self._submit(pixel_tasks.convert_task, (source_spec, target_spec), [source, target], finish)
+
+    def encode_async(self, image: Image.Image, fmt: str, **params) -> Future:
+        """Encode to bytes in Pillow format fmt (e.g. 'PNG', 'WEBP')"""
+        if not self.offloads(image):
+            return self._inline(lambda: self._encode_inline(image, fmt, params))
+        # Pixels cross processes without image.info; pass what save() would read from it
+        params = {**{key: image.info[key] for key in ENCODE_INFO_KEYS if key in image.info}, **params}
+        source, source_spec = self._share(image)
+        # Room for the raw pixels plus headers covers all but pathological PNGs
+        capacity = image.width * image.height * BYTES_PER_PIXEL[image.mode] + 65536
+        target = shared_memory.SharedMemory(create=True, size=capacity)
+
+        def finish(result):
+            if isinstance(result, bytes):
+                return result
+            return bytes(target.buf[:result])
+
+        return self._submit(pixel_tasks.encode_task, (source_spec, target.name, capacity, fmt, params),
+                            [source, target], finish)
+
+    @staticmethod
+    def _encode_inline(image: Image.Image, fmt: str, params: Dict[str, Any]) -> bytes:
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, **params)
+        return buffer.getvalue()
+
+    def resize(self, image: Image.Image, size: Tuple[int, int]) -> Image.Image:
+        with span("resize"):
+            return self.resize_async(image, size).result()
+
+    def thumbnail(self, image: Image.Image, max_size: Tuple[int, int]) -> Image.Image:
+        with span("resize"):
+            return self.thumbnail_async(image, max_size).result()
+
+    def convert(self, image: Image.Image, mode: str) -> Image.Image:
+        return self.convert_async(image, mode).result()
+
+    def encode(self, image: Image.Image, fmt: str, **params) -> bytes:
+        with span("encode"):
+            return self.encode_async(image, fmt, **params).result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            stats = dict(self.metrics)
+        stats['workers'] = self.workers
+        stats['running'] = self._executor is not None
+        return stats
+
+
+_pool: Optional[ProcessImagePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessImagePool:
+    """Process-wide pool shared by every session; worker processes start on first offload"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessImagePool(
+                Settings.PROCESS_POOL_WORKERS,
+                Settings.PROCESS_POOL_MAX_PENDING,
+                Settings.PROCESS_POOL_MAX_TASKS_PER_CHILD,
+                Settings.PROCESS_POOL_MIN_PIXELS,
+                Settings.PROCESS_POOL_SUBMIT_TIMEOUT,
+            )
+        return _pool
@@ -0,0 +1,114 @@
+import time
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from utils.generated_image import GeneratedImage
+from utils.instrumentation import observe
+
+# Recent time-to-first-feedback samples (seconds), shared by every session
+_ttff_samples = deque(maxlen=500)
+_ttff_lock = threading.Lock()
+
+
+class GenerationCancelled(Exception):
+    """Raised inside a generation once its caller has cancelled it"""
+
+
+class GenerationProgress:
+    """Partial output of a running generation, written by the worker and polled by the UI"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.first_feedback_at: Optional[float] = None
+        self.text = ""
+        self.status = ""
+        self.preview: Optional[GeneratedImage] = None
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """Raise GenerationCancelled if the caller gave up; call between chunks"""
+        if self.cancelled:
+            raise GenerationCancelled("Generation cancelled")
+
+    def _mark_feedback(self):
+        if self.first_feedback_at is None:
+            self.first_feedback_at = time.monotonic()
+            record_ttff(self.first_feedback_at - self.started_at)
+
+    def add_text(self, text: str):
+        self._mark_feedback()
+        self.text += text
+
+    def set_preview(self, preview: GeneratedImage):
+        self._mark_feedback()
+        self.preview = preview
+
+    def set_status(self, status: str):
+        self.status = status
+
+    @property
+    def time_to_first_feedback(self) -> Optional[float]:
+        if self.first_feedback_at is None:
+            return None
+        return self.first_feedback_at - self.started_at
+
+
+class AttemptProgress(GenerationProgress):
+    """Private progress for one of several racing attempts at the same request
+
+    Cancelling it stops only this attempt; cancelling the parent stops all
+    of them. Output is forwarded to the parent only while `publishing`, so
+    racing attempts never interleave their output in one progress object.
+    """
+
+    def __init__(self, parent: GenerationProgress, publishing: bool):
+        super().__init__()
+        self.parent = parent
+        self.publishing = publishing
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set() or self.parent.cancelled
+
+    # TTFF is recorded by the parent, once per request rather than per attempt
+    def add_text(self, text: str):
+        self.text += text
+        if self.publishing:
+            self.parent.add_text(text)
+
+    def set_preview(self, preview: GeneratedImage):
+        self.preview = preview
+        if self.publishing:
+            self.parent.set_preview(preview)
+
+    def set_status(self, status: str):
+        self.status = status
+        if self.publishing:
+            self.parent.set_status(status)
+
+
+def record_ttff(seconds: float):
+    with _ttff_lock:
+        _ttff_samples.append(seconds)
+    observe("time_to_first_feedback", seconds)
+
+
+def ttff_summary() -> Dict[str, Optional[float]]:
+    """p50/p95 time-to-first-feedback over recent generations"""
+    with _ttff_lock:
+        samples = sorted(_ttff_samples)
+    if not samples:
+        return {'samples': 0, 'p50': None, 'p95': None}
+    return {
+        'samples': len(samples),
+        'p50': samples[int(0.50 * (len(samples) - 1))],
+        'p95': samples[int(0.95 * (len(samples) - 1))],
+    }
@@ -0,0 +1,170 @@
+import re
+import sys
+import hashlib
+import functools
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+from config.config import (
+    STYLE_PRESETS, ASPECT_RATIOS, CLOTHING_OPTIONS, POSE_OPTIONS, FACIAL_EXPRESSIONS,
+    BACKGROUND_OPTIONS, FACE_ENHANCEMENT, BODY_MODIFICATIONS,
+)
+from config.settings import Settings
+
+# Preset groups in canonical composition order; earlier groups win when the
+# token budget forces fragments to be dropped
+PRESET_GROUPS: Dict[str, Dict[str, str]] = {
+    'style': STYLE_PRESETS,
+    'aspect_ratio': ASPECT_RATIOS,
+    'clothing': CLOTHING_OPTIONS,
+    'pose': POSE_OPTIONS,
+    'expression': FACIAL_EXPRESSIONS,
+    'background': BACKGROUND_OPTIONS,
+    'face': FACE_ENHANCEMENT,
+    'body': BODY_MODIFICATIONS,
+}
+
+QUALITY_BOOST = "high quality, detailed, professional, sharp focus, well-composed"
+
+# UI sentinels meaning "no preset selected"
+NO_SELECTION = frozenset({"None", "Default", ""})
+
+Selection = Union[str, Sequence[str], None]
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _normalize_phrase(phrase: str) -> str:
+    return " ".join(phrase.lower().split())
+
+
+def _split_fragments(description: str) -> Tuple[str, ...]:
+    """Comma-separated preset text as interned, normalized phrases"""
+    return tuple(
+        sys.intern(_normalize_phrase(part))
+        for part in description.split(",")
+        if part.strip()
+    )
+
+
+def _words(phrase: str) -> frozenset:
+    return frozenset(_WORD.findall(phrase))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+
+# Precomputed once at import: group -> option -> interned phrases
+_FRAGMENTS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    group: {option: _split_fragments(text) for option, text in presets.items()}
+    for group, presets in PRESET_GROUPS.items()
+}
+_QUALITY_FRAGMENTS = _split_fragments(QUALITY_BOOST)
+_ORDER: Dict[str, Dict[str, int]] = {
+    group: {option: index for index, option in enumerate(presets)}
+    for group, presets in PRESET_GROUPS.items()
+}
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """A composed prompt plus what went into it"""
+    text: str
+    base: str
+    fragments: Tuple[str, ...]
+    dropped: Tuple[str, ...]
+    selections: Tuple[Tuple[str, Tuple[str, ...]], ...]
+    tokens: int
+
+    @property
+    def key(self) -> str:
+        """Stable identifier of the canonical prompt text"""
+        return hashlib.sha256(self.text.encode('utf-8')).hexdigest()
+
+
+def canonical_selections(selections: Optional[Mapping[str, Selection]]) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    """Order groups and options canonically, dropping empty selections
+
+    Raises ValueError for unknown groups or options.
+    """
+    canonical = []
+    for group, chosen in (selections or {}).items():
+        if group not in PRESET_GROUPS:
+            raise ValueError(f"Unknown preset group: {group}")
+        if chosen is None or isinstance(chosen, str):
+            chosen = [] if chosen is None else [chosen]
+        options = set()
+        for option in chosen:
+            if option in NO_SELECTION:
+                continue
+            if option not in PRESET_GROUPS[group]:
+                raise ValueError(f"Unknown {group} preset: {option}")
+            options.add(option)
+        if options:
+            canonical.append((group, tuple(sorted(options, key=_ORDER[group].__getitem__))))
+    group_order = list(PRESET_GROUPS)
+    canonical.sort(key=lambda item: group_order.index(item[0]))
+    return tuple(canonical)
+
+
+def _dedupe(phrases: Iterable[str], seen: List[frozenset]) -> Tuple[List[str], List[str]]:
+    """Drop phrases whose words are already covered by an earlier phrase"""
+    kept, dropped = [], []
+    for phrase in phrases:
+        words = _words(phrase)
+        if not words or any(words <= earlier for earlier in seen):
+            dropped.append(phrase)
+            continue
+        seen.append(words)
+        kept.append(phrase)
+    return kept, dropped
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile(base: str, selections: Tuple[Tuple[str, Tuple[str, ...]], ...],
+             quality_boost: bool, token_budget: int) -> CompiledPrompt:
+    candidates: List[str] = []
+    for group, options in selections:
+        for option in options:
+            candidates.extend(_FRAGMENTS[group][option])
+    if quality_boost:
+        candidates.extend(_QUALITY_FRAGMENTS)
+
+    # The user's own words are never dropped, but count towards dedup
+    seen = [_words(_normalize_phrase(part)) for part in base.split(",") if part.strip()]
+    fragments, dropped = _dedupe(candidates, seen)
+
+    # The budget covers the added fragments only, so a long base prompt can't
+    # crowd out the presets the user picked. Fragments are in priority order:
+    # trim from the end until within budget.
+    while fragments and estimate_tokens(", ".join(fragments)) > token_budget:
+        dropped.append(fragments.pop())
+    text = ", ".join([base, *fragments]) if base else ", ".join(fragments)
+
+    return CompiledPrompt(
+        text=text,
+        base=base,
+        fragments=tuple(fragments),
+        dropped=tuple(dropped),
+        selections=selections,
+        tokens=estimate_tokens(text),
+    )
+
+
+def compile_prompt(base_prompt: str, selections: Optional[Mapping[str, Selection]] = None,
+                   quality_boost: bool = True, token_budget: Optional[int] = None) -> CompiledPrompt:
+    """Compose a base prompt with preset selections into one canonical prompt
+
+    `selections` maps a group from PRESET_GROUPS to an option name or a list of
+    option names; "None"/"Default" mean no selection. The result does not
+    depend on selection order, and repeated or overlapping phrases appear once,
+    so equivalent requests produce the same text and cache key.
+
+    `token_budget` caps the preset and quality fragments; the base prompt is
+    neither counted nor trimmed.
+    """
+    base = " ".join(base_prompt.split()).strip(" ,.")
+    budget = Settings.PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    return _compile(base, canonical_selections(selections), quality_boost, budget)
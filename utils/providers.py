@@ -0,0 +1,225 @@
+import time
+import random
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence
+
+from config.settings import Settings
+from utils.generated_image import GeneratedImage
+from utils.image_generator import ImageGenerator
+from utils.progress import GenerationCancelled, GenerationProgress
+from utils.resilience import BackendError, ResilientBackend
+
+
+class ImageProvider:
+    """Interface shared by every text-to-image backend"""
+
+    name = "base"
+    backend: Optional[ResilientBackend] = None
+
+    def available(self) -> bool:
+        """Whether the provider is configured and its circuit breaker lets calls through
+
+        Uses would_allow() so an open breaker counts as available again once
+        its recovery window has passed; the half-open probe itself is claimed
+        by ResilientBackend.call.
+        """
+        return self.backend is None or self.backend.breaker.would_allow()
+
+    def generate(self, prompt: str, progress: Optional[GenerationProgress] = None) -> GeneratedImage:
+        """Return the generated image or raise BackendError
+
+        Providers that can stream publish partial output to progress and stop
+        once it is cancelled.
+        """
+        raise NotImplementedError
+
+
+class GeminiProvider(ImageProvider):
+    name = "gemini"
+
+    def __init__(self, client):
+        self.client = client
+        self.backend = client.backend
+
+    def generate(self, prompt: str, progress: Optional[GenerationProgress] = None) -> GeneratedImage:
+        result = self.client.generate_image_or_raise(prompt, progress)
+        if result is None:
+            raise BackendError("Gemini returned no image", retryable=False)
+        result.provider = result.provider or self.name
+        return result
+
+
+class HuggingFaceProvider(ImageProvider):
+    name = "huggingface"
+
+    def __init__(self, hf_token: Optional[str] = None):
+        self.generator = ImageGenerator()
+        self.backend = self.generator.backend
+        self.hf_token = hf_token
+
+    def generate(self, prompt: str, progress: Optional[GenerationProgress] = None) -> GeneratedImage:
+        # The Inference API has no streaming mode, so only status updates are possible
+        if progress is not None:
+            progress.check_cancelled()
+            progress.set_status("Waiting for Hugging Face (this may take 30-60 seconds)...")
+        content = self.generator.fetch_huggingface(prompt, self.hf_token)
+        return GeneratedImage(content, provider=self.name)
+
+
+class UnavailableProvider(ImageProvider):
+    """Placeholder for integrations that are not implemented yet (Replicate, DALL-E)"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def available(self) -> bool:
+        return False
+
+    def generate(self, prompt: str, progress: Optional[GenerationProgress] = None) -> GeneratedImage:
+        raise BackendError(f"{self.name} integration coming soon!", retryable=False)
+
+
+class StubProvider(ImageProvider):
+    """Local provider returning canned bytes with configurable latency and failure rate"""
+
+    def __init__(self, name: str, data: bytes, latency: float = 0.0, error_rate: float = 0.0,
+                 backend: Optional[ResilientBackend] = None):
+        self.name = name
+        self.data = data
+        self.latency = latency
+        self.error_rate = error_rate
+        self.backend = backend
+
+    def generate(self, prompt: str, progress: Optional[GenerationProgress] = None) -> GeneratedImage:
+        if self.backend is not None:
+            return self.backend.call(self._generate)
+        return self._generate()
+
+    def _generate(self) -> GeneratedImage:
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            raise BackendError(f"{self.name} stub failure", status=503, retryable=True)
+        return GeneratedImage(self.data, provider=self.name)
+
+
+class ProviderStats:
+    """Rolling latency/error window and in-flight count for one provider"""
+
+    def __init__(self, window: int):
+        self._samples = deque(maxlen=window)  # (latency seconds, succeeded)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, latency: float, ok: bool, sample: bool = True):
+        with self._lock:
+            self.in_flight -= 1
+            if sample:
+                self._samples.append((latency, ok))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = list(self._samples)
+            in_flight = self.in_flight
+        latencies = sorted(latency for latency, ok in samples if ok)
+        errors = sum(1 for _, ok in samples if not ok)
+
+        def percentile(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+        return {
+            'samples': len(samples),
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'error_rate': errors / len(samples) if samples else 0.0,
+            'in_flight': in_flight,
+        }
+
+
+_stats: Dict[str, ProviderStats] = {}
+_stats_lock = threading.Lock()
+
+
+def get_provider_stats(name: str) -> ProviderStats:
+    """Process-wide stats, so every session's router learns from all traffic"""
+    with _stats_lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = ProviderStats(Settings.ROUTER_WINDOW)
+            _stats[name] = stats
+        return stats
+
+
+def get_all_provider_stats() -> Dict[str, Dict[str, Any]]:
+    with _stats_lock:
+        names = list(_stats)
+    return {name: get_provider_stats(name).snapshot() for name in names}
+
+
+class ProviderRouter:
+    """Routes each request to the provider with the best observed latency and health"""
+
+    def __init__(self, providers: Sequence[ImageProvider], error_penalty: float = Settings.ROUTER_ERROR_PENALTY):
+        self.providers = list(providers)
+        self.error_penalty = error_penalty
+
+    def score(self, provider: ImageProvider) -> float:
+        """Expected cost of sending one more request; lower is better"""
+        stats = get_provider_stats(provider.name).snapshot()
+        if stats['p50'] is None:
+            # No successful samples yet: try it early so we learn its latency
+            return 0.0 if stats['samples'] == 0 else float('inf')
+        expected_latency = 0.5 * stats['p50'] + 0.5 * stats['p95']
+        queue_factor = 1 + stats['in_flight']
+        return expected_latency * queue_factor * (1 + self.error_penalty * stats['error_rate'])
+
+    def ranked(self) -> List[ImageProvider]:
+        """Available providers ordered from preferred to last resort"""
+        available = [provider for provider in self.providers if provider.available()]
+        return sorted(available, key=self.score)
+
+    def generate(self, prompt: str, progress: Optional[GenerationProgress] = None) -> GeneratedImage:
+        """Generate with the best provider, failing over to the next on error"""
+        last_error: Optional[Exception] = None
+        for provider in self.ranked():
+            stats = get_provider_stats(provider.name)
+            stats.start()
+            started = time.monotonic()
+            try:
+                result = provider.generate(prompt, progress)
+            except GenerationCancelled:
+                stats.finish(time.monotonic() - started, ok=False, sample=False)
+                raise
+            except Exception as e:
+                stats.finish(time.monotonic() - started, ok=False)
+                last_error = e
+                continue
+            # Cache hits say nothing about the provider's latency
+            stats.finish(time.monotonic() - started, ok=True, sample=result.provider != "cache")
+            return result
+
+        if last_error is not None:
+            raise last_error
+        raise BackendError("No image provider is currently available", retryable=False)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            provider.name: dict(get_provider_stats(provider.name).snapshot(), available=provider.available())
+            for provider in self.providers
+        }
+
+
+def build_router(gemini_client, hf_token: Optional[str] = None) -> ProviderRouter:
+    """Router over every provider configured for this session"""
+    providers: List[ImageProvider] = [GeminiProvider(gemini_client)]
+    if hf_token:
+        providers.append(HuggingFaceProvider(hf_token))
+    providers.append(UnavailableProvider("replicate"))
+    providers.append(UnavailableProvider("dalle"))
+    return ProviderRouter(providers)
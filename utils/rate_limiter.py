@@ -0,0 +1,211 @@
+import time
+import heapq
+import hashlib
+import itertools
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import Settings
+from utils.instrumentation import current_session
+from utils.progress import GenerationProgress
+
+
+class RateLimitTimeout(RuntimeError):
+    """Raised when a request could not get a rate limit slot in time"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take tokens if available; otherwise return the seconds to wait before retrying"""
+        with self._lock:
+            self._refill_locked()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None):
+        """Block until tokens are available"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimitTimeout("Rate limit wait exceeded timeout")
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hand out no tokens for `seconds`, e.g. after the API answered 429"""
+        with self._lock:
+            self._refill_locked()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class FairQueue:
+    """Weighted fair queueing of a token bucket's slots across sessions
+
+    Each request gets a virtual finish time of max(now, the session's previous
+    finish) + 1 / weight, and slots are granted in finish-time order. A session
+    with many queued requests therefore takes turns with everyone else instead
+    of draining the bucket, while an idle bucket still serves anyone at once.
+    """
+
+    # Upper bound on how long a waiter sleeps before re-checking its turn
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, bucket: TokenBucket, max_wait: Optional[float] = None):
+        self.bucket = bucket
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._waiting: List[Tuple[float, int, Optional[str]]] = []  # heap of tickets
+        self._virtual_time = 0.0
+        self._last_finish: Dict[Optional[str], float] = {}
+        self._weights: Dict[Optional[str], float] = {}
+        self._seq = itertools.count()
+        self.granted = 0
+        self.timeouts = 0
+        self.peak_depth = 0
+
+    def set_weight(self, session: Optional[str], weight: float):
+        """Give a session a larger (or smaller) share of the quota; default weight is 1"""
+        with self._cond:
+            self._weights[session] = weight
+
+    def _position_locked(self, ticket) -> int:
+        return sum(1 for other in self._waiting if other < ticket) + 1
+
+    def _grant_locked(self, ticket):
+        heapq.heappop(self._waiting)
+        self._virtual_time = ticket[0]
+        self.granted += 1
+        self._forget_idle_locked()
+        self._cond.notify_all()
+
+    def _forget_idle_locked(self):
+        """Drop finish times that no longer matter, so _last_finish stays bounded
+
+        A session with nothing queued whose finish time is at or behind virtual
+        time would restart from virtual time anyway.
+        """
+        waiting = {ticket[2] for ticket in self._waiting}
+        idle = [session for session, finish in self._last_finish.items()
+                if finish <= self._virtual_time and session not in waiting]
+        for session in idle:
+            del self._last_finish[session]
+
+    def acquire(self, session: Optional[str] = None, weight: Optional[float] = None,
+                timeout: Optional[float] = None, progress: Optional[GenerationProgress] = None):
+        """Block until it is this session's turn and a token is available
+
+        Queue position is published to progress while waiting. Raises
+        RateLimitTimeout after timeout (default max_wait) seconds.
+        """
+        if session is None:
+            session = current_session.get()
+        timeout = self.max_wait if timeout is None else timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            share = weight or self._weights.get(session, 1.0)
+            start = max(self._virtual_time, self._last_finish.get(session, 0.0))
+            ticket = (start + 1.0 / share, next(self._seq), session)
+            self._last_finish[session] = ticket[0]
+            heapq.heappush(self._waiting, ticket)
+            self.peak_depth = max(self.peak_depth, len(self._waiting))
+            try:
+                while True:
+                    if self._waiting[0] == ticket:
+                        wait = self.bucket.try_acquire()
+                        if wait == 0.0:
+                            self._grant_locked(ticket)
+                            if progress is not None:
+                                progress.set_status("")
+                            return
+                    else:
+                        wait = self.POLL_INTERVAL
+                    if deadline is not None and time.monotonic() + min(wait, self.POLL_INTERVAL) > deadline:
+                        self.timeouts += 1
+                        raise RateLimitTimeout("Rate limit wait exceeded timeout")
+                    if progress is not None:
+                        progress.check_cancelled()
+                        position = self._position_locked(ticket)
+                        progress.set_status(
+                            f"Waiting for API quota: position {position} of {len(self._waiting)}"
+                        )
+                    self._cond.wait(min(wait, self.POLL_INTERVAL))
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    if all(other[2] != session for other in self._waiting):
+                        # Everything it was granted finished at or before virtual time
+                        self._last_finish.pop(session, None)
+                    self._forget_idle_locked()
+                    self._cond.notify_all()
+                raise
+
+    def pause(self, seconds: float):
+        self.bucket.pause(seconds)
+
+    def position(self, session: Optional[str]) -> Optional[Tuple[int, int]]:
+        """(position, queue length) of the session's earliest waiting request, if any"""
+        with self._cond:
+            tickets = [ticket for ticket in self._waiting if ticket[2] == session]
+            if not tickets:
+                return None
+            return self._position_locked(min(tickets)), len(self._waiting)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'waiting': len(self._waiting),
+                'waiting_sessions': len({ticket[2] for ticket in self._waiting}),
+                'peak_depth': self.peak_depth,
+                'granted': self.granted,
+                'timeouts': self.timeouts,
+                'rate_per_minute': self.bucket.rate * 60,
+                'burst': self.bucket.capacity,
+            }
+
+
+_limiters: Dict[str, FairQueue] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str) -> FairQueue:
+    """Process-wide fair limiter shared by every client using the same API key"""
+    key_id = hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+    with _limiters_lock:
+        limiter = _limiters.get(key_id)
+        if limiter is None:
+            limiter = FairQueue(
+                TokenBucket(
+                    Settings.GEMINI_REQUESTS_PER_MINUTE / 60.0,
+                    Settings.GEMINI_REQUEST_BURST,
+                ),
+                Settings.RATE_LIMIT_MAX_WAIT,
+            )
+            _limiters[key_id] = limiter
+        return limiter
+
+
+def get_rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Queue statistics per API key (abbreviated key hash)"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {key_id[:8]: limiter.stats() for key_id, limiter in limiters.items()}
@@ -0,0 +1,302 @@
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Optional
+
+from config.settings import Settings
+from utils.progress import AttemptProgress, GenerationCancelled, GenerationProgress
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class BackendError(Exception):
+    """Classified failure from an image backend"""
+
+    def __init__(self, message: str, status: Optional[int] = None,
+                 retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(BackendError):
+    """Raised without calling the backend while its circuit breaker is open"""
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Seconds from a Retry-After header (or similar hint), None if absent or unparseable"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        # HTTP-date form is rare for these APIs; treat as unknown
+        return None
+
+
+def classify_error(exc: Exception) -> BackendError:
+    """Map SDK/HTTP exceptions to a BackendError with retry information"""
+    if isinstance(exc, BackendError):
+        return exc
+
+    response = getattr(exc, 'response', None)
+    status = getattr(exc, 'code', None) or getattr(exc, 'status_code', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+    if not isinstance(status, int):
+        status = None
+
+    headers = getattr(response, 'headers', None) or {}
+    retry_after = parse_retry_after(headers.get('Retry-After') if hasattr(headers, 'get') else None)
+
+    if status is not None:
+        retryable = status in RETRYABLE_STATUS_CODES
+    else:
+        # No status: network-level failures (timeouts, resets) are worth retrying
+        retryable = isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in (
+            'Timeout', 'ConnectTimeout', 'ReadTimeout', 'ConnectionError',
+            'ConnectError', 'ReadError', 'RemoteProtocolError',
+        )
+
+    error = BackendError(str(exc), status=status, retryable=retryable, retry_after=retry_after)
+    error.__cause__ = exc
+    return error
+
+
+class RetryPolicy:
+    """Jittered exponential backoff that honors server-provided Retry-After"""
+
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, error: BackendError) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None to give up"""
+        if not error.retryable or attempt + 1 >= self.max_attempts:
+            return None
+        if error.retry_after is not None:
+            if error.retry_after > self.max_delay:
+                return None
+            return error.retry_after + random.uniform(0, self.base_delay)
+        # Full jitter keeps clients from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Stops calling a backend after repeated failures, then probes it again"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, recovery_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_seconds:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def would_allow(self) -> bool:
+        """Whether allow() would let a call through now, without changing state"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at >= self.recovery_seconds
+            return not self._probe_in_flight
+
+    def seconds_until_retry(self) -> float:
+        return max(0.0, self.recovery_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._probe_in_flight = False
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """Neutral outcome (e.g. a client error): just free the half-open probe slot"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class ResilientBackend:
+    """Retry, circuit breaking and optional hedging around calls to one backend"""
+
+    def __init__(self, name: str, policy: RetryPolicy, breaker: CircuitBreaker,
+                 hedge_after: Optional[float] = None):
+        self.name = name
+        self.policy = policy
+        self.breaker = breaker
+        self.hedge_after = hedge_after
+        self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix=f"{name}-hedge")
+        self._metrics_lock = threading.Lock()
+        self.metrics = {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'retries': 0,
+            'rejected_open': 0,
+            'hedges': 0,
+            'hedge_wins': 0,
+        }
+
+    def _count(self, metric: str, amount: int = 1):
+        with self._metrics_lock:
+            self.metrics[metric] += amount
+
+    def _attempt(self, fn: Callable[..., Any], args, kwargs) -> Any:
+        if self.hedge_after is None:
+            return fn(*args, **kwargs)
+
+        # Hedge: if the first request is slow, race a second one and take whichever wins.
+        # Only the primary streams to the caller's progress; each attempt can be
+        # cancelled on its own through its AttemptProgress.
+        primary, primary_progress = self._launch(fn, args, kwargs, publishing=True)
+        attempts = {primary: primary_progress}
+        pending = {primary}
+        try:
+            done, pending = wait(pending, timeout=self.hedge_after)
+            if done:
+                return primary.result()
+
+            self._count('hedges')
+            hedge, hedge_progress = self._launch(fn, args, kwargs, publishing=False)
+            attempts[hedge] = hedge_progress
+            pending.add(hedge)
+            error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            self._count('hedge_wins')
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            # Stop the loser so it doesn't keep streaming and using quota
+            for future in pending:
+                future.cancel()
+                if attempts[future] is not None:
+                    attempts[future].cancel()
+
+    def _launch(self, fn: Callable[..., Any], args, kwargs, publishing: bool):
+        """Submit one attempt with its own progress in place of the caller's"""
+        progress = None
+        args = list(args)
+        kwargs = dict(kwargs)
+        for i, value in enumerate(args):
+            if isinstance(value, GenerationProgress):
+                progress = args[i] = AttemptProgress(value, publishing)
+        for name, value in kwargs.items():
+            if isinstance(value, GenerationProgress):
+                progress = kwargs[name] = AttemptProgress(value, publishing)
+        # Copy the context so the session (fair queueing, spans) follows the attempt
+        future = self._hedge_pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        return future, progress
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn with retries; raises BackendError once retries are exhausted"""
+        self._count('calls')
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self._count('rejected_open')
+                raise CircuitOpenError(
+                    f"{self.name} is temporarily unavailable, "
+                    f"retry in {self.breaker.seconds_until_retry():.0f}s",
+                    retryable=False,
+                    retry_after=self.breaker.seconds_until_retry(),
+                )
+            try:
+                result = self._attempt(fn, args, kwargs)
+            except GenerationCancelled:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                error = classify_error(e)
+                if error.retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                delay = self.policy.delay(attempt, error)
+                if delay is None:
+                    self._count('failures')
+                    raise error
+                self._count('retries')
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            self.breaker.record_success()
+            self._count('successes')
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            stats = dict(self.metrics)
+        stats['breaker_state'] = self.breaker.state
+        stats['breaker_trips'] = self.breaker.trips
+        return stats
+
+
+_backends: Dict[str, ResilientBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_resilient_backend(name: str) -> ResilientBackend:
+    """Process-wide resilience wrapper for the named backend"""
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backend = ResilientBackend(
+                name,
+                RetryPolicy(
+                    Settings.RETRY_MAX_ATTEMPTS,
+                    Settings.RETRY_BASE_DELAY,
+                    Settings.RETRY_MAX_DELAY,
+                ),
+                CircuitBreaker(
+                    Settings.BREAKER_FAILURE_THRESHOLD,
+                    Settings.BREAKER_RECOVERY_SECONDS,
+                ),
+                hedge_after=Settings.HEDGE_AFTER_SECONDS,
+            )
+            _backends[name] = backend
+        return backend
+
+
+def get_resilience_metrics() -> Dict[str, Dict[str, Any]]:
+    """Retry/breaker metrics for every backend used so far"""
+    with _backends_lock:
+        backends = list(_backends.values())
+    return {backend.name: backend.stats() for backend in backends}
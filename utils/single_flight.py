@@ -0,0 +1,98 @@
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from utils.progress import GenerationCancelled, GenerationProgress
+
+
+class _Call:
+    """One in-flight execution that later identical callers attach to"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running wait for and share its result (or exception). Nothing is
+    remembered once the call finishes, so this only deduplicates in-flight
+    work; completed results are the generation cache's job.
+    """
+
+    # How often a waiting caller checks whether it was cancelled
+    POLL_INTERVAL = 0.25
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[..., Any], *args,
+           progress: Optional[GenerationProgress] = None, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) unless an identical call is already running"""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    self._calls[key] = call
+                    self.executions += 1
+                else:
+                    call.waiters += 1
+                    self.coalesced += 1
+
+            if leader:
+                return self._run(key, call, fn, args, kwargs)
+
+            if progress is not None:
+                progress.set_status("Waiting for an identical request already in progress")
+            while not call.done.wait(self.POLL_INTERVAL):
+                if progress is not None:
+                    progress.check_cancelled()
+
+            if isinstance(call.error, GenerationCancelled):
+                # The leader's caller gave up, not us: try again, possibly as the new leader
+                continue
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+    def _run(self, key: str, call: _Call, fn: Callable[..., Any], args, kwargs) -> Any:
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'waiting': sum(call.waiters for call in self._calls.values()),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+            }
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Process-wide coalescer shared by every session"""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
@@ -0,0 +1,42 @@
+import time
+import importlib
+import threading
+from types import ModuleType
+from typing import Any, Dict, Optional
+
+# Set when this module is first imported, i.e. early in the process's first script run
+PROCESS_STARTED = time.perf_counter()
+
+_import_times: Dict[str, float] = {}
+_first_run_seconds: Optional[float] = None
+_lock = threading.Lock()
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Import a heavy module on first use, recording how long the first import took"""
+    with _lock:
+        if name in _import_times:
+            return importlib.import_module(name)
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = time.perf_counter() - started
+    with _lock:
+        _import_times.setdefault(name, elapsed)
+    return module
+
+
+def mark_first_run_complete():
+    """Record how long the first script run of this process took"""
+    global _first_run_seconds
+    with _lock:
+        if _first_run_seconds is None:
+            _first_run_seconds = time.perf_counter() - PROCESS_STARTED
+
+
+def startup_report() -> Dict[str, Any]:
+    """Cold start timings: first run duration and first-import cost of lazily loaded modules"""
+    with _lock:
+        return {
+            'first_run_ms': round(_first_run_seconds * 1000, 1) if _first_run_seconds is not None else None,
+            'lazy_imports_ms': {name: round(seconds * 1000, 1) for name, seconds in _import_times.items()},
+        }
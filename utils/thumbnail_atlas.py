@@ -0,0 +1,170 @@
+import os
+import mmap
+import struct
+import threading
+import contextlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, one process per atlas dir
+    fcntl = None
+
+SLOT_HEADER = struct.Struct('<HH')  # thumbnail width, height within the slot
+CURSOR = struct.Struct('<Q')  # total slots ever written, at the start of the key file
+KEY_BYTES = 32  # raw SHA-256 digest
+EMPTY_KEY = bytes(KEY_BYTES)
+
+
+def _map_file(path: Path, size: int) -> mmap.mmap:
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.fstat(fd).st_size != size:
+            # Sparse on most filesystems: unused slots take no disk space
+            os.ftruncate(fd, size)
+        return mmap.mmap(fd, size)
+    finally:
+        os.close(fd)
+
+
+class ThumbnailAtlas:
+    """Fixed-size RGB thumbnail slots in a memory-mapped file, keyed by image digest
+
+    Each slot holds one thumbnail as raw pixels, so reading it back is a copy
+    out of the page cache with no decode. Slots are reused round-robin once
+    the atlas is full; a parallel key file maps slots to image digests and
+    survives restarts. Several server processes may share the files: writes
+    hold an exclusive flock on the key file, and reads hold a shared one and
+    check the slot's key, so a slot reused by another process reads as a miss.
+    """
+
+    def __init__(self, root: str, slot_size: Tuple[int, int], capacity: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.slot_size = slot_size
+        self.capacity = capacity
+        width, height = slot_size
+        self.slot_bytes = SLOT_HEADER.size + width * height * 3
+        name = f"atlas-{width}x{height}"
+        self._pixels = _map_file(self.root / f"{name}.rgb", capacity * self.slot_bytes)
+        self._keys = _map_file(self.root / f"{name}.keys", CURSOR.size + capacity * KEY_BYTES)
+        self._lock_fd = os.open(self.root / f"{name}.keys", os.O_RDWR)
+        self._lock = threading.Lock()
+        # Local view of where each digest lives; verified against the key file on use
+        self._slots: Dict[bytes, int] = {}
+        with self._locked(exclusive=False):
+            for slot in range(capacity):
+                key = self._key_at(slot)
+                if key != EMPTY_KEY:
+                    self._slots[key] = slot
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive: bool):
+        """This process's thread lock plus a file lock shared with other processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _find_locked(self, key: bytes) -> Optional[int]:
+        slot = self._slots.get(key)
+        if slot is not None and self._key_at(slot) != key:
+            # Another process reused the slot
+            del self._slots[key]
+            slot = None
+        return slot
+
+    def _key_at(self, slot: int) -> bytes:
+        offset = CURSOR.size + slot * KEY_BYTES
+        return self._keys[offset:offset + KEY_BYTES]
+
+    def _set_key(self, slot: int, key: bytes):
+        offset = CURSOR.size + slot * KEY_BYTES
+        self._keys[offset:offset + KEY_BYTES] = key
+
+    def __contains__(self, digest: str) -> bool:
+        with self._locked(exclusive=False):
+            return self._find_locked(bytes.fromhex(digest)) is not None
+
+    def _fit(self, image: Image.Image) -> Image.Image:
+        if image.width > self.slot_size[0] or image.height > self.slot_size[1]:
+            image = image.copy()
+            image.thumbnail(self.slot_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+        return image if image.mode == 'RGB' else image.convert('RGB')
+
+    def put(self, digest: str, image: Image.Image):
+        """Store a thumbnail of image under digest (hex SHA-256), overwriting the oldest slot when full"""
+        key = bytes.fromhex(digest)
+        if digest in self:
+            return
+        image = self._fit(image)
+        record = SLOT_HEADER.pack(image.width, image.height) + image.tobytes()
+
+        with self._locked(exclusive=True):
+            if self._find_locked(key) is not None:
+                return
+            cursor = CURSOR.unpack_from(self._keys, 0)[0]
+            slot = cursor % self.capacity
+            previous = self._key_at(slot)
+            if self._slots.get(previous) == slot:
+                del self._slots[previous]
+            # Clear the key first so a crash mid-write never pairs a key with torn pixels
+            self._set_key(slot, EMPTY_KEY)
+            offset = slot * self.slot_bytes
+            self._pixels[offset:offset + len(record)] = record
+            self._set_key(slot, key)
+            CURSOR.pack_into(self._keys, 0, cursor + 1)
+            self._slots[key] = slot
+            self.writes += 1
+
+    def get(self, digest: str) -> Optional[Image.Image]:
+        """The stored thumbnail, or None if it was never written or has been overwritten"""
+        with self._locked(exclusive=False):
+            slot = self._find_locked(bytes.fromhex(digest))
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            offset = slot * self.slot_bytes
+            width, height = SLOT_HEADER.unpack_from(self._pixels, offset)
+            start = offset + SLOT_HEADER.size
+            # Slicing an mmap copies, so a later put() into this slot can't change the image
+            pixels = self._pixels[start:start + width * height * 3]
+        return Image.frombytes('RGB', (width, height), pixels)
+
+    def flush(self):
+        with self._locked(exclusive=False):
+            self._pixels.flush()
+            self._keys.flush()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'slots_used': len(self._slots),
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+            }
+
+
+def contact_sheet(thumbnails: List[Image.Image], cell_size: Tuple[int, int], columns: int) -> Image.Image:
+    """One row of thumbnails centred in cell_size cells on a transparent background"""
+    cell_width, cell_height = cell_size
+    sheet = Image.new('RGBA', (cell_width * columns, cell_height), (0, 0, 0, 0))
+    for i, thumbnail in enumerate(thumbnails[:columns]):
+        left = i * cell_width + (cell_width - thumbnail.width) // 2
+        top = (cell_height - thumbnail.height) // 2
+        sheet.paste(thumbnail, (left, top))
+    return sheet
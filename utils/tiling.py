@@ -0,0 +1,264 @@
+import io
+import os
+import time
+import tempfile
+import threading
+import contextlib
+import contextvars
+from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+from config.settings import Settings
+from utils.instrumentation import span
+from utils.progress import GenerationProgress
+
+if TYPE_CHECKING:
+    from utils.gemini_client import GeminiClient
+
+Box = Tuple[int, int, int, int]  # left, top, right, bottom
+TileFn = Callable[[np.ndarray], np.ndarray]
+
+_swept_dirs: Set[str] = set()
+_swept_lock = threading.Lock()
+
+
+def tile_starts(length: int, tile: int, overlap: int) -> List[int]:
+    """Tile offsets along one axis: stride tile - overlap, last tile flush with the edge"""
+    if length <= tile:
+        return [0]
+    stride = max(1, tile - overlap)
+    starts = list(range(0, length - tile + 1, stride))
+    if starts[-1] + tile < length:
+        starts.append(length - tile)
+    return starts
+
+
+def plan_tiles(width: int, height: int, tile: int, overlap: int) -> List[Box]:
+    """Overlapping tiles covering a width x height image, row by row"""
+    return [
+        (left, top, min(left + tile, width), min(top + tile, height))
+        for top in tile_starts(height, tile, overlap)
+        for left in tile_starts(width, tile, overlap)
+    ]
+
+
+def _ramp(length: int, feather: int, ramp_start: bool, ramp_end: bool) -> np.ndarray:
+    weights = np.ones(length, dtype=np.float32)
+    if feather <= 0:
+        return weights
+    ramp = (np.arange(min(feather, length), dtype=np.float32) + 0.5) / feather
+    if ramp_start:
+        weights[:len(ramp)] = np.minimum(weights[:len(ramp)], ramp)
+    if ramp_end:
+        weights[length - len(ramp):] = np.minimum(weights[length - len(ramp):], ramp[::-1])
+    return weights
+
+
+def feather_mask(box: Box, size: Tuple[int, int], feather: int) -> np.ndarray:
+    """Blend weights for a tile: linear ramps on edges shared with neighbours, 1 at image borders"""
+    left, top, right, bottom = box
+    width, height = size
+    x = _ramp(right - left, feather, left > 0, right < width)
+    y = _ramp(bottom - top, feather, top > 0, bottom < height)
+    return np.outer(y, x)
+
+
+def load_as_memmap(data: bytes, scratch_dir: Optional[str] = None) -> np.memmap:
+    """Decode an upload into an on-disk HxWx3 uint8 array for tiled processing
+
+    Decoding is the only step that touches the full frame; afterwards tiles
+    are read from the memory map and the decoded image is released. The
+    array lives in a scratch file under TILE_SCRATCH_DIR; pass it to
+    discard_scratch(), or open it with scratch(), so the file is removed once
+    processing is done.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width * image.height > Settings.MAX_IMAGE_PIXELS:
+            raise ValueError(f"Image is {image.width}x{image.height}, above the pixel limit")
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        pixels = _scratch_array(scratch_dir, (image.height, image.width, 3), np.uint8)
+        strip = Settings.TILE_SIZE
+        for top in range(0, image.height, strip):
+            bottom = min(top + strip, image.height)
+            pixels[top:bottom] = np.asarray(image.crop((0, top, image.width, bottom)))
+    pixels.flush()
+    return pixels
+
+
+def sweep_scratch(scratch_dir: Optional[str] = None, max_age: float = Settings.TILE_SCRATCH_MAX_AGE) -> int:
+    """Delete scratch files older than max_age seconds, left behind by crashed or careless callers
+
+    Runs once per directory before its first scratch file is created; returns
+    how many files were removed.
+    """
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in Path(scratch_dir or Settings.TILE_SCRATCH_DIR).glob("*.raw"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def _scratch_array(scratch_dir: Optional[str], shape, dtype) -> np.memmap:
+    directory = scratch_dir or Settings.TILE_SCRATCH_DIR
+    os.makedirs(directory, exist_ok=True)
+    with _swept_lock:
+        if directory not in _swept_dirs:
+            _swept_dirs.add(directory)
+            sweep_scratch(directory)
+    fd, path = tempfile.mkstemp(suffix=".raw", dir=directory)
+    os.close(fd)
+    return np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+
+
+def discard_scratch(array: np.memmap):
+    """Delete the scratch file behind an array from load_as_memmap() or process()"""
+    path = array.filename
+    del array
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+@contextlib.contextmanager
+def scratch(array: np.memmap) -> Iterator[np.memmap]:
+    """Use a scratch array and delete its file on exit, e.g. with scratch(load_as_memmap(data)) as pixels:"""
+    try:
+        yield array
+    finally:
+        discard_scratch(array)
+
+
+class TiledProcessor:
+    """Run a per-tile function over a large image with bounded memory
+
+    The image is split into overlapping tiles, at most `workers * 2` tiles are
+    in flight, and results are accumulated with feathered weights into
+    disk-backed buffers, so peak memory depends on tile size and parallelism
+    rather than image size. The function may return a tile of any size (for
+    example a model's fixed output size); it is resized to the tile's place
+    in the output, which is `scale` times the input.
+    """
+
+    def __init__(self, tile_size: int = Settings.TILE_SIZE, overlap: int = Settings.TILE_OVERLAP,
+                 workers: int = Settings.TILE_WORKERS, scratch_dir: Optional[str] = None):
+        if overlap >= tile_size:
+            raise ValueError("Tile overlap must be smaller than the tile size")
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.workers = workers
+        self.scratch_dir = scratch_dir
+
+    @staticmethod
+    def _output_box(box: Box, scale: float) -> Box:
+        return tuple(int(round(edge * scale)) for edge in box)
+
+    def _run_tile(self, fn: TileFn, tile: np.ndarray, out_size: Tuple[int, int]) -> np.ndarray:
+        with span("tile"):
+            result = np.asarray(fn(tile))
+        if result.ndim == 2:
+            result = np.stack([result] * 3, axis=-1)
+        result = result[..., :3]
+        if (result.shape[1], result.shape[0]) != out_size:
+            result = np.asarray(Image.fromarray(result.astype(np.uint8)).resize(out_size, Image.Resampling.LANCZOS))
+        return result
+
+    def _tasks(self, source: np.ndarray, boxes: List[Box], scale: float) -> Iterator[Tuple[Box, np.ndarray, Tuple[int, int]]]:
+        for box in boxes:
+            left, top, right, bottom = box
+            out_left, out_top, out_right, out_bottom = self._output_box(box, scale)
+            # Copy so the worker does not hold pages of the memory map
+            yield box, np.ascontiguousarray(source[top:bottom, left:right]), (out_right - out_left, out_bottom - out_top)
+
+    def process(self, source: np.ndarray, fn: TileFn, scale: float = 1.0,
+                progress: Optional[GenerationProgress] = None) -> np.memmap:
+        """Apply fn tile by tile; returns the blended HxWx3 uint8 result as a memory map
+
+        The result lives in a scratch file under TILE_SCRATCH_DIR; pass it to
+        discard_scratch(), or open it with scratch(), once it has been saved
+        elsewhere.
+        """
+        height, width = source.shape[:2]
+        out_size = (int(round(width * scale)), int(round(height * scale)))
+        feather = int(round(self.overlap * scale))
+        boxes = plan_tiles(width, height, self.tile_size, self.overlap)
+
+        accumulator = _scratch_array(self.scratch_dir, (out_size[1], out_size[0], 3), np.float32)
+        weights = _scratch_array(self.scratch_dir, (out_size[1], out_size[0]), np.float32)
+
+        def blend(box: Box, tile: np.ndarray):
+            out_left, out_top, out_right, out_bottom = self._output_box(box, scale)
+            mask = feather_mask((out_left, out_top, out_right, out_bottom), out_size, feather)
+            accumulator[out_top:out_bottom, out_left:out_right] += tile * mask[..., None]
+            weights[out_top:out_bottom, out_left:out_right] += mask
+
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tiles")
+        in_flight = {}
+        done_count = 0
+
+        def collect(done):
+            nonlocal done_count
+            for future in done:
+                blend(in_flight.pop(future), future.result())
+                done_count += 1
+                if progress is not None:
+                    progress.set_status(f"Processed tile {done_count} of {len(boxes)}")
+
+        try:
+            for box, tile, tile_out_size in self._tasks(source, boxes, scale):
+                if progress is not None:
+                    progress.check_cancelled()
+                if len(in_flight) >= self.workers * 2:
+                    collect(wait(in_flight, return_when=FIRST_COMPLETED)[0])
+                context = contextvars.copy_context()
+                in_flight[pool.submit(context.run, self._run_tile, fn, tile, tile_out_size)] = box
+            while in_flight:
+                collect(wait(in_flight, return_when=FIRST_COMPLETED)[0])
+        except BaseException:
+            discard_scratch(accumulator)
+            discard_scratch(weights)
+            raise
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        # Normalize strip by strip so this pass is bounded too
+        result = _scratch_array(self.scratch_dir, (out_size[1], out_size[0], 3), np.uint8)
+        strip = max(1, self.tile_size)
+        for top in range(0, out_size[1], strip):
+            bottom = min(top + strip, out_size[1])
+            total = np.maximum(weights[top:bottom], 1e-6)[..., None]
+            result[top:bottom] = np.clip(accumulator[top:bottom] / total + 0.5, 0, 255).astype(np.uint8)
+        result.flush()
+        discard_scratch(accumulator)
+        discard_scratch(weights)
+        return result
+
+
+def gemini_tile_fn(client: "GeminiClient", instruction: str) -> TileFn:
+    """Tile function that asks Gemini to apply instruction to each tile"""
+    types = client.types
+
+    def run(tile: np.ndarray) -> np.ndarray:
+        buffer = io.BytesIO()
+        Image.fromarray(tile).save(buffer, format="PNG", compress_level=1)
+        result = client.edit_image_or_raise([
+            types.Part.from_bytes(data=buffer.getvalue(), mime_type="image/png"),
+            instruction,
+        ])
+        if result is None:
+            # The model declined this tile: keep the original pixels
+            return tile
+        image = result.image
+        return np.asarray(image if image.mode == 'RGB' else image.convert('RGB'))
+
+    return run
@@ -1,63 +1,52 @@
 import streamlit as st
-import io
-from datetime import datetime
 import json
-from config.config import STYLE_PRESETS, ASPECT_RATIOS
+from utils.prompt_compiler import compile_prompt
+from config.settings import Settings
+from utils.encoding import get_encoder
+from utils.history_store import get_history_store, new_history
 
 def init_session_state():
     """Initialize session state variables"""
     if 'generation_history' not in st.session_state:
-        st.session_state.generation_history = []
+        st.session_state.generation_history = new_history()
     if 'edit_history' not in st.session_state:
-        st.session_state.edit_history = []
+        st.session_state.edit_history = new_history()
     if 'analysis_history' not in st.session_state:
-        st.session_state.analysis_history = []
+        st.session_state.analysis_history = new_history()
 
 def enhance_prompt(base_prompt, style, aspect_ratio, quality_boost=True):
     """Enhance user prompt with style and technical improvements"""
-    enhanced = base_prompt
-    
-    if style != "None":
-        enhanced = f"{enhanced}, {STYLE_PRESETS[style]}"
-    
-    if aspect_ratio != "Default":
-        enhanced = f"{enhanced}, {ASPECT_RATIOS[aspect_ratio]}"
-    
-    if quality_boost:
-        enhanced = f"{enhanced}, high quality, detailed, professional, sharp focus, well-composed"
-    
-    return enhanced
+    selections = {'style': style, 'aspect_ratio': aspect_ratio}
+    return compile_prompt(base_prompt, selections, quality_boost).text
+
+def normalize_prompt(prompt):
+    """Canonicalize prompt whitespace so trivially different inputs share a cache key"""
+    return " ".join(prompt.split())
 
 def save_to_history(item_type, data):
-    """Save operations to history"""
-    history_item = {
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        'type': item_type,
-        'data': data
-    }
-    
+    """Save operations to history
+
+    Only a compact record stays in session state; the image itself is written
+    to the shared on-disk store and a thumbnail kept within the memory budget.
+    """
+    init_session_state()
     if item_type == 'generation':
-        st.session_state.generation_history.insert(0, history_item)
-        if len(st.session_state.generation_history) > 20:
-            st.session_state.generation_history.pop()
+        history = st.session_state.generation_history
     elif item_type == 'edit':
-        st.session_state.edit_history.insert(0, history_item)
-        if len(st.session_state.edit_history) > 20:
-            st.session_state.edit_history.pop()
+        history = st.session_state.edit_history
     else:  # analysis
-        st.session_state.analysis_history.insert(0, history_item)
-        if len(st.session_state.analysis_history) > 20:
-            st.session_state.analysis_history.pop()
+        history = st.session_state.analysis_history
+    
+    return get_history_store().add(history, item_type, data)
 
-def create_download_link(image, filename):
-    """Create download button for images"""
-    buf = io.BytesIO()
-    image.save(buf, format='PNG')
+def create_download_link(image, filename, fmt=None):
+    """Create download button for images (Settings.DOWNLOAD_FORMAT unless fmt is given)"""
+    encoded = get_encoder().encode(image, fmt or Settings.DOWNLOAD_FORMAT, 'high')
     return st.download_button(
         f"Download {filename}",
-        buf.getvalue(),
-        f"{filename}.png",
-        "image/png"
+        encoded.data,
+        encoded.file_name(filename),
+        encoded.mime_type
     )
 
 def get_css_styles():